@@ -0,0 +1,115 @@
+"""
+Persistent address -> integer id table.
+
+Pair and sender addresses are interned to dense ids (see
+swap_table.Interner), so detection compares integers. This table keeps
+those ids stable across runs: it is an append-only flat file of 20-byte
+addresses after an 8-byte header, and an address's id is its record number.
+Pairs and bots seen in earlier runs keep their ids, and the file holds each
+address in 20 bytes instead of a 42-character string.
+
+Several processes (shard workers) can share one file. New addresses are
+appended under an exclusive file lock, after first reading whatever other
+processes appended, so every process assigns the same id to an address.
+The file is created on first use, not when the table is constructed.
+"""
+
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+MAGIC = b"ADDRID01"
+RECORD = 20
+
+class AddressTable:
+    """Append-only, file-backed interner for 0x-prefixed lowercase addresses"""
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = {}
+        self.values = []
+        self.lock = threading.Lock()
+        self.fd = None
+
+    def _open(self):
+        """Open (or create) the file and load it, once (caller holds self.lock)"""
+        if self.fd is not None:
+            return
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._file_lock():
+                if os.fstat(self.fd).st_size == 0:
+                    os.write(self.fd, MAGIC)
+                elif os.pread(self.fd, len(MAGIC), 0) != MAGIC:
+                    raise ValueError(f"{self.path} is not an address table")
+                self.size = len(MAGIC)
+                self._catch_up()
+        except BaseException:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    @contextmanager
+    def _file_lock(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """Load records appended since we last read the file (caller holds both locks)"""
+        end = os.fstat(self.fd).st_size
+        # A torn record from a crashed writer: drop it (we hold the file lock)
+        usable = self.size + (end - self.size) // RECORD * RECORD
+        if usable != end:
+            os.ftruncate(self.fd, usable)
+        if usable > self.size:
+            data = os.pread(self.fd, usable - self.size, self.size)
+            for offset in range(0, len(data), RECORD):
+                address = "0x" + data[offset:offset + RECORD].hex()
+                self.ids[address] = len(self.values)
+                self.values.append(address)
+            self.size = usable
+
+    def id(self, value):
+        """Id of an address, appending it to the table if it is new"""
+        i = self.ids.get(value)
+        if i is None:
+            i = self.intern_many([value])[0]
+        return i
+
+    def intern_many(self, values):
+        """Ids for a list of addresses, appending all new ones in one write"""
+        ids = self.ids
+        if all(v in ids for v in values):
+            return [ids[v] for v in values]
+
+        with self.lock:
+            self._open()
+            with self._file_lock():
+                self._catch_up()
+                new = {}
+                for value in values:
+                    if value not in ids and value not in new:
+                        record = bytes.fromhex(value[2:]) if value.startswith("0x") else b""
+                        if len(record) != RECORD or "0x" + record.hex() != value:
+                            raise ValueError(f"Not a lowercase 0x-prefixed address: {value!r}")
+                        new[value] = record
+                for value in new:
+                    ids[value] = len(self.values)
+                    self.values.append(value)
+                if new:
+                    data = b"".join(new.values())
+                    os.pwrite(self.fd, data, self.size)
+                    self.size += len(data)
+        return [ids[v] for v in values]
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        with self.lock:
+            self._open()
+        return len(self.values)
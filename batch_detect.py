@@ -0,0 +1,156 @@
+"""
+Vectorized sandwich detection over a whole fetch window (needs numpy).
+
+find_sandwiches_in_block works block by block in Python. Here the columns
+of a window's SwapTable (block, tx_index, log_index, interned pair and
+sender ids, direction, amounts) are viewed as numpy arrays, and grouping,
+ordering and the frontrun/backrun amount test run as numpy operations over
+the whole window at once.
+
+Amounts are uint256, too wide for numpy integers, so the amount test runs on
+a scaled representation (log2 of the float value) with a slightly wider
+tolerance than the real one. That only selects candidates; each candidate
+is then checked exactly with Python ints, so the results are identical to
+running find_sandwiches_in_block on every block, in the same order.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Extra slack on the log2 amount window; covers float rounding of huge amounts
+LOG_SLACK = 1.1
+
+# Spacing between keys in the combined (key, log2 amount) sort value. log2 of
+# a uint256 is < 256, and with fewer than 2^22 keys the combined value keeps
+# a resolution far finer than the amount window.
+KEY_SPACING = 1024.0
+
+def available():
+    """Whether numpy is installed"""
+    return np is not None
+
+def swap_columns(swaps):
+    """numpy views of a SwapTable's columns, plus the (block, pair) grouping"""
+    block = np.frombuffer(swaps.block, dtype=np.int64)
+    pair = np.frombuffer(swaps.pair, dtype=np.int64)
+
+    # Blocks, and (block, pair) groups, with the position each is first seen at
+    _, block_first, block_id = np.unique(block, return_index=True, return_inverse=True)
+    _, group = np.unique(block * (pair.max() + 1) + pair, return_inverse=True)
+
+    return {
+        "block": block,
+        "block_rank": block_first[block_id.reshape(-1)],
+        "group": group.reshape(-1),
+        "tx_index": np.frombuffer(swaps.tx_index, dtype=np.int64),
+        "log_index": np.frombuffer(swaps.log_index, dtype=np.int64),
+        "sender": np.frombuffer(swaps.sender, dtype=np.int64),
+        "direction": np.frombuffer(swaps.direction, dtype=np.int8),
+    }
+
+def log_amounts(amounts):
+    """1 + log2(amount) as float64, with 0 for zero amounts"""
+    values = np.array([float(a) for a in amounts], dtype=np.float64)
+    scaled = np.zeros(len(values))
+    positive = values > 0
+    scaled[positive] = 1.0 + np.log2(values[positive])
+    return scaled
+
+def find_sandwiches_batch(swaps, tolerance):
+    """
+    Find sandwiches in a SwapTable holding any number of blocks. Same output
+    as concatenating find_sandwiches_in_block over the table's blocks in
+    first-seen order.
+    """
+    if len(swaps) < 3:
+        return []
+    cols = swap_columns(swaps)
+    n = len(swaps)
+
+    # Order the window like the per-block path: blocks and pairs in first-seen
+    # order, swaps within a pair by (tx_index, log_index); lexsort is stable
+    group_rank = np.full(cols["group"].max() + 1, n, dtype=np.int64)
+    np.minimum.at(group_rank, cols["group"], np.arange(n))
+    order = np.lexsort((cols["log_index"], cols["tx_index"], group_rank[cols["group"]], cols["block_rank"]))
+
+    group = cols["group"][order]
+    sender = cols["sender"][order]
+    direction = cols["direction"][order].astype(np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], group[1:] != group[:-1])))
+    group_start = np.repeat(starts, np.diff(np.append(starts, n)))
+    position = np.arange(n) - group_start  # position within the pair's sorted swaps
+
+    # Backrun lookup table: swaps sorted by (group, sender, direction, log2
+    # amount in). Direction is the low bit of the raw key, so flipping it
+    # gives the key a matching backrun must have.
+    raw_key = (group * (sender.max() + 1) + sender) * 2 + direction
+    keys, key = np.unique(raw_key, return_inverse=True)
+    key = key.reshape(-1)
+    amount_in, amount_out = swaps.amount_in, swaps.amount_out
+    log_in = log_amounts([amount_in[i] for i in order])
+    log_out = log_amounts([amount_out[i] for i in order])
+    table_value = key * KEY_SPACING + log_in
+    table = np.argsort(table_value, kind="stable")
+    table_value = table_value[table]
+
+    # For each frontrun: backruns with the same sender, other direction,
+    # and input within the (widened) tolerance of its output
+    query = raw_key ^ 1
+    slot = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    found = keys[slot] == query
+
+    window = -np.log2(1 - tolerance) * LOG_SLACK
+    lo = np.searchsorted(table_value, slot * KEY_SPACING + log_out - window, side="left")
+    hi = np.searchsorted(table_value, slot * KEY_SPACING + log_out + window, side="right")
+    hi = np.where(found, hi, lo)
+
+    counts = hi - lo
+    frontrun = np.repeat(np.arange(n), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    backrun = table[np.repeat(lo, counts) + offsets]
+
+    keep = position[backrun] >= position[frontrun] + 2
+    frontrun, backrun = frontrun[keep], backrun[keep]
+
+    # Victims are the frontrun-direction swaps in between. Per-direction
+    # prefix counts give each candidate's slice of the position list of that
+    # direction; candidates with an empty slice are dropped.
+    same_direction = [np.flatnonzero(direction == d) for d in (0, 1)]
+    prefix = [np.concatenate(([0], np.cumsum(direction == d))) for d in (0, 1)]
+    front_dir = direction[frontrun]
+    victim_lo = np.where(front_dir == 0, prefix[0][frontrun + 1], prefix[1][frontrun + 1])
+    victim_hi = np.where(front_dir == 0, prefix[0][backrun], prefix[1][backrun])
+    keep = victim_hi > victim_lo
+    frontrun, backrun = frontrun[keep], backrun[keep]
+    victim_lo, victim_hi = victim_lo[keep], victim_hi[keep]
+
+    # Exact checks on the remaining candidates, in per-block output order
+    order = order.tolist()
+    same_direction = [positions.tolist() for positions in same_direction]
+    sandwiches = []
+    tx = swaps.tx
+    ranked = np.lexsort((backrun, frontrun))
+    for fr, bk, lo, hi in zip(frontrun[ranked].tolist(), backrun[ranked].tolist(),
+                              victim_lo[ranked].tolist(), victim_hi[ranked].tolist()):
+        i, k = order[fr], order[bk]
+        frontrun_out = amount_out[i]
+        backrun_in = amount_in[k]
+        if backrun_in == 0 or abs(frontrun_out - backrun_in) / backrun_in > tolerance:
+            continue
+
+        victims = [order[j] for j in same_direction[swaps.direction[i]][lo:hi]]
+        victims = [v for v in victims if tx[v] != tx[i] and tx[v] != tx[k]]
+        if not victims:
+            continue
+
+        sandwiches.append({
+            "block": swaps.block[i],
+            "frontrun": i,
+            "backrun": k,
+            "victims": victims,
+            "revenue_raw": amount_out[k] - amount_in[i],
+        })
+
+    return sandwiches
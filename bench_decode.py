@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark Swap log decoding: SwapTable.append_log on each log vs
+SwapTable.extend_logs on the whole response.
+
+Uses eth_getLogs responses from the RPC cache when it has any, otherwise
+synthetic Swap logs. Both paths must produce identical tables.
+
+Usage:
+    python3 bench_decode.py [number of logs]
+"""
+
+import os
+import random
+import sys
+import time
+
+from rpc_cache import RPCCache
+from swap_table import SwapTable
+
+SWAP_TOPIC = "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
+COLUMNS = ["block", "tx_index", "log_index", "tx", "pair", "sender", "direction",
+           "amount_in", "amount_out"]
+ROUNDS = 5
+
+def cached_logs(limit):
+    """Swap logs from cached eth_getLogs responses (up to limit), or []"""
+    cache_dir = os.environ.get("RPC_CACHE_DIR", "rpc_cache")
+    if not os.path.isdir(cache_dir):
+        return []
+    cache = RPCCache(cache_dir, float("inf"), read_only=True)
+    logs = []
+    for ranges in cache.log_ranges.values():
+        for _, _, key in ranges:
+            logs.extend(cache._read(key) or [])
+            if len(logs) >= limit:
+                return logs[:limit]
+    return logs
+
+def synthetic_logs(count, seed=1):
+    """Swap logs shaped like mainnet: a few hundred pairs, bots trading often"""
+    rnd = random.Random(seed)
+    pairs = [f"0x{rnd.getrandbits(160):040X}" for _ in range(300)]
+    senders = [f"{rnd.getrandbits(160):040x}" for _ in range(2000)]
+    logs = []
+    block = 13916166
+    tx_index = 0
+    for i in range(count):
+        if rnd.random() < 0.01:
+            block += 1
+            tx_index = 0
+        if rnd.random() < 0.7:
+            tx_index += 1
+        amount = rnd.getrandbits(rnd.choice([40, 64, 80, 100]))
+        amounts = [amount, 0, 0, amount * 3] if rnd.random() < 0.5 else [0, amount, amount * 3, 0]
+        logs.append({
+            "address": rnd.choice(pairs),
+            "topics": [SWAP_TOPIC, "0x" + "0" * 24 + rnd.choice(senders), "0x" + "0" * 24 + rnd.choice(senders)],
+            "data": "0x" + "".join(f"{a:064x}" for a in amounts),
+            "blockNumber": hex(block),
+            "transactionHash": f"0x{block:032x}{tx_index:032x}",
+            "transactionIndex": hex(tx_index),
+            "logIndex": hex(i % 500),
+        })
+    return logs
+
+def rows(table):
+    """Table contents with ids resolved (the two paths may number addresses differently)"""
+    columns = [list(getattr(table, c)) for c in COLUMNS]
+    columns[COLUMNS.index("tx")] = [table.hashes[i] for i in table.tx]
+    for c in ("pair", "sender"):
+        columns[COLUMNS.index(c)] = [table.addresses[i] for i in getattr(table, c)]
+    return columns
+
+def per_log(logs):
+    table = SwapTable()
+    for log in logs:
+        table.append_log(log)
+    return table
+
+def best_time(decode, logs):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        decode(logs)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    logs = cached_logs(count)
+    source = "RPC cache"
+    if not logs:
+        logs = synthetic_logs(count)
+        source = "synthetic"
+    print(f"Decoding {len(logs):,} Swap logs ({source}), best of {ROUNDS}")
+
+    if rows(per_log(logs)) != rows(SwapTable.from_logs(logs)):
+        print("ERROR: bulk decoder output differs from the per-log path")
+        exit(1)
+
+    slow = best_time(per_log, logs)
+    fast = best_time(SwapTable.from_logs, logs)
+    print(f"  per-log (append_log):   {slow * 1000:8.1f} ms  {len(logs) / slow:12,.0f} logs/s")
+    print(f"  bulk (extend_logs):     {fast * 1000:8.1f} ms  {len(logs) / fast:12,.0f} logs/s")
+    print(f"  speedup: {slow / fast:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Crash-consistent scan checkpoints.
+
+A scan's durable state is one small JSON file (the progress file): the
+block ranges scanned so far (a Coverage interval list, see coverage.py), the
+byte length of the output CSV that belongs to them, and the queue of failed
+windows. It is replaced atomically: written to a temp file, fsynced,
+renamed over the old one, and the directory fsynced, so after a crash it is
+always either the old or the new checkpoint, never a torn one.
+
+The CSV is fsynced before the checkpoint that covers it is written. Rows
+appended after the last checkpoint are not covered by it, so on resume the
+CSV is cut back to the recorded length and those windows are scanned again.
+Every row therefore ends up in the CSV exactly once, however the scan
+stopped, and checkpoints can be written every few seconds instead of after
+every window.
+
+Older progress files are still read: ones holding just a block number, and
+ones with a "next_block" instead of scanned ranges, which mean everything
+before that block was scanned. A bare block number has no output length, so
+nothing is truncated for it.
+"""
+
+import json
+import os
+
+def read_checkpoint(path):
+    """The checkpoint saved at path as a dict, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        text = f.read().strip()
+    if not text.startswith("{"):
+        # Legacy progress file: just the next block
+        return {"next_block": int(text), "output_bytes": None, "failed": []}
+    return json.loads(text)
+
+def write_checkpoint(path, checkpoint):
+    """Durably replace the checkpoint at path (temp file, fsync, rename, fsync dir)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path) or ".")
+
+def fsync_dir(path):
+    """Make a rename in a directory durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def restore_output(path, size):
+    """
+    Cut an output file back to the length recorded in its checkpoint,
+    dropping rows written after it. Returns the number of bytes dropped.
+    """
+    if size is None or not os.path.exists(path):
+        return 0
+    actual = os.path.getsize(path)
+    if actual < size:
+        raise RuntimeError(f"{path} is shorter ({actual:,} bytes) than its checkpoint ({size:,} bytes)")
+    if actual > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+            f.flush()
+            os.fsync(f.fileno())
+    return actual - size
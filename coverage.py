@@ -0,0 +1,82 @@
+"""
+Set of scanned block ranges.
+
+A single "next block" only describes progress when windows finish in
+order. Coverage keeps the scanned blocks as sorted, disjoint, inclusive
+intervals instead, so windows can be recorded in any order: adjacent and
+overlapping ranges merge, and a scan that keeps its windows contiguous
+stays at one or a few intervals however many windows it has done. Gap and
+count queries use binary search over the interval starts.
+
+Coverage is saved in the scan checkpoint (see checkpoint.py) as a list of
+[from_block, to_block] pairs.
+"""
+
+from bisect import bisect_left, bisect_right
+
+class Coverage:
+    """Disjoint inclusive block intervals, kept sorted and merged"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for from_block, to_block in intervals:
+            self.add(from_block, to_block)
+
+    def add(self, from_block, to_block):
+        """Mark from_block..to_block scanned"""
+        if to_block < from_block:
+            return
+        # Intervals that overlap or touch the new one are merged into it
+        i = bisect_left(self.ends, from_block - 1)
+        j = bisect_right(self.starts, to_block + 1)
+        if i < j:
+            from_block = min(from_block, self.starts[i])
+            to_block = max(to_block, self.ends[j - 1])
+        self.starts[i:j] = [from_block]
+        self.ends[i:j] = [to_block]
+
+    def count(self, lo, hi):
+        """Scanned blocks within lo..hi"""
+        total = 0
+        i = bisect_left(self.ends, lo)
+        while i < len(self.starts) and self.starts[i] <= hi:
+            total += min(hi, self.ends[i]) - max(lo, self.starts[i]) + 1
+            i += 1
+        return total
+
+    def next_gap(self, block, hi):
+        """First unscanned range (from, to) at or after block, up to hi, or None"""
+        i = bisect_right(self.starts, block) - 1
+        if i >= 0 and self.ends[i] >= block:
+            block = self.ends[i] + 1
+        if block > hi:
+            return None
+        i = bisect_right(self.starts, block)
+        gap_end = self.starts[i] - 1 if i < len(self.starts) else hi
+        return block, min(gap_end, hi)
+
+    def gaps(self, lo, hi):
+        """All unscanned ranges within lo..hi, in order"""
+        gaps = []
+        gap = self.next_gap(lo, hi)
+        while gap is not None:
+            gaps.append(gap)
+            gap = self.next_gap(gap[1] + 1, hi)
+        return gaps
+
+    def is_complete(self, lo, hi):
+        return self.next_gap(lo, hi) is None
+
+    def __contains__(self, block):
+        i = bisect_right(self.starts, block) - 1
+        return i >= 0 and self.ends[i] >= block
+
+    def intervals(self):
+        """[[from_block, to_block], ...] for saving"""
+        return [[s, e] for s, e in zip(self.starts, self.ends)]
+
+    def __len__(self):
+        return len(self.starts)
@@ -0,0 +1,21 @@
+"""
+Columns of the sandwich CSV, shared by the scanner and the CSV tools.
+"""
+
+# Output CSV schema (one row per victim)
+CSV_COLUMNS = [
+    'frontrun_etherscan',
+    'victim_etherscan',
+    'backrun_etherscan',
+    'block_number',
+    'timestamp',
+    'datetime_utc',
+    'pair_address',
+    'attacker_address',
+    'frontrun_tx',
+    'victim_tx',
+    'backrun_tx',
+    'num_victims',
+    'revenue_eth',
+    'revenue_raw'
+]
@@ -0,0 +1,151 @@
+"""
+Coarse swap-density index: Swap logs per block for each 10k-block bucket.
+
+Swap density (and so parse/detection cost) varies a lot over 2022-2024, so
+shards with equal block counts finish at very different times. The index
+is seeded with a few small eth_getLogs samples per bucket and refined with
+the real log counts of every window the scanner fetches. It is persisted
+in swap_density.json and used to cut shards with equal expected work.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BUCKET_BLOCKS = 10_000
+
+# Sampling used for buckets we have never scanned
+SAMPLES_PER_BUCKET = 3
+SAMPLE_BLOCKS = 10
+
+# Cost of one block (fetching it) relative to one Swap log (decoding + detection)
+WORK_PER_BLOCK = 1.0
+
+class DensityIndex:
+    """Observed Swap logs per block, bucketed by block number"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.buckets = {}  # bucket -> [blocks observed, logs observed]
+        self.lock = threading.Lock()
+        self.load()
+
+    def record(self, from_block, to_block, num_logs):
+        """Add a fetched window's log count, split across the buckets it covers"""
+        total = to_block - from_block + 1
+        with self.lock:
+            block = from_block
+            while block <= to_block:
+                bucket = block // BUCKET_BLOCKS
+                seg_end = min(to_block, (bucket + 1) * BUCKET_BLOCKS - 1)
+                blocks = seg_end - block + 1
+                entry = self.buckets.setdefault(bucket, [0, 0])
+                entry[0] += blocks
+                entry[1] += num_logs * blocks / total
+                block = seg_end + 1
+
+    def density(self, bucket):
+        """Average Swap logs per block in a bucket, or None if never observed"""
+        entry = self.buckets.get(bucket)
+        if not entry or not entry[0]:
+            return None
+        return entry[1] / entry[0]
+
+    def missing(self, start_block, end_block):
+        """Buckets in the range with no observations yet"""
+        return [b for b in range(start_block // BUCKET_BLOCKS, end_block // BUCKET_BLOCKS + 1)
+                if self.density(b) is None]
+
+    def sample(self, start_block, end_block, fetch_logs, concurrency=8):
+        """Fill in unobserved buckets with SAMPLES_PER_BUCKET small fetches each"""
+        windows = []
+        for bucket in self.missing(start_block, end_block):
+            lo = max(start_block, bucket * BUCKET_BLOCKS)
+            hi = min(end_block, (bucket + 1) * BUCKET_BLOCKS - 1)
+            span = hi - lo + 1
+            for i in range(SAMPLES_PER_BUCKET):
+                from_block = lo + span * (2 * i + 1) // (2 * SAMPLES_PER_BUCKET)
+                windows.append((from_block, min(hi, from_block + SAMPLE_BLOCKS - 1)))
+
+        def fetch(window):
+            try:
+                logs = fetch_logs(*window)
+            except Exception as e:
+                # Leave the sample out rather than record a wrong density
+                print(f"  Density sample {window[0]:,}-{window[1]:,} failed: {e}")
+                return
+            self.record(*window, len(logs))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(fetch, windows))
+        return len(windows)
+
+    def work(self, from_block, to_block, default_density):
+        """Estimated work for a block range"""
+        total = 0.0
+        block = from_block
+        while block <= to_block:
+            bucket = block // BUCKET_BLOCKS
+            seg_end = min(to_block, (bucket + 1) * BUCKET_BLOCKS - 1)
+            density = self.density(bucket)
+            density = default_density if density is None else density
+            total += (seg_end - block + 1) * (WORK_PER_BLOCK + density)
+            block = seg_end + 1
+        return total
+
+    def split(self, start_block, end_block, num_parts):
+        """Cut start..end into num_parts contiguous ranges of roughly equal expected work"""
+        known = [d for d in (self.density(b) for b in self.buckets) if d is not None]
+        default_density = sum(known) / len(known) if known else 0.0
+
+        # One segment per bucket, work spread evenly inside it
+        segments = []
+        block = start_block
+        while block <= end_block:
+            seg_end = min(end_block, (block // BUCKET_BLOCKS + 1) * BUCKET_BLOCKS - 1)
+            segments.append((block, seg_end, self.work(block, seg_end, default_density)))
+            block = seg_end + 1
+
+        total = sum(w for _, _, w in segments)
+        bounds = [start_block]
+        done = 0.0
+        part = 1
+        for seg_start, seg_end, work in segments:
+            while part < num_parts and work > 0 and done + work >= total * part / num_parts:
+                fraction = (total * part / num_parts - done) / work
+                cut = seg_start + int(fraction * (seg_end - seg_start + 1))
+                bounds.append(max(cut, bounds[-1] + 1))
+                part += 1
+            done += work
+        bounds.append(end_block + 1)
+
+        return [(bounds[i], bounds[i + 1] - 1) for i in range(len(bounds) - 1)
+                if bounds[i] <= bounds[i + 1] - 1]
+
+    def load(self):
+        """Load the index from disk"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            self.buckets = {int(k): v for k, v in json.load(f).items()}
+
+    def save(self):
+        """
+        Persist the index, keeping the larger observation for each bucket so
+        parallel workers don't wipe out each other's counts.
+        """
+        if not self.path:
+            return
+        saved = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        with self.lock:
+            for bucket, entry in self.buckets.items():
+                if entry[0] >= saved.get(str(bucket), [0, 0])[0]:
+                    saved[str(bucket)] = entry
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,165 @@
+"""
+Pool of RPC endpoints (cloud providers and local nodes) shared by all calls.
+
+Each endpoint keeps its own CU budget and AIMD concurrency (see
+rate_limit.Throttle), plus running averages of latency and error rate.
+pick() prefers endpoints that have a free concurrency slot and weights them
+by speed and reliability, so a fast local archive node takes the bulk of
+the traffic and cloud providers absorb the overflow.
+
+Each endpoint has a circuit breaker. After several consecutive failures the
+circuit opens: the endpoint is out of rotation for a cooldown (doubling on
+each repeat, up to MAX_COOLDOWN). When the cooldown expires the circuit is
+half-open: exactly one request goes to the endpoint as a health check, and
+the others avoid it until it answers. A success closes the circuit, a
+failure opens it again.
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from rate_limit import Throttle
+from rpc_transport import post_json
+
+# Consecutive failures before an endpoint is taken out of rotation
+MAX_FAILURES = 3
+
+# Seconds an unhealthy endpoint sits out, doubling on each repeat
+BASE_COOLDOWN = 10.0
+MAX_COOLDOWN = 300.0
+
+# A half-open probe that hasn't reported back by then (e.g. a cancelled
+# hedge) no longer blocks the next one
+PROBE_TIMEOUT = 60.0
+
+class Endpoint:
+    """One RPC URL with its throttle and health statistics"""
+
+    def __init__(self, url, cu_per_second, max_concurrency):
+        self.url = url
+        parts = urlsplit(url)
+        # Never print the path: for hosted providers it contains the API key
+        self.name = f"{parts.scheme}://{parts.netloc}"
+        self.throttle = Throttle(cu_per_second, max_concurrency)
+        self.latency = 0.5     # running average, seconds
+        self.error_rate = 0.0  # running average, 0..1
+        self.failures = 0      # consecutive failures
+        self.cooldown = BASE_COOLDOWN
+        self.down_until = 0.0
+        self.circuit = "closed"  # "open" while cooling down, "half-open" while probing
+        self.probe_started = 0.0
+
+    def is_healthy(self, now):
+        """Whether a request may go to this endpoint now"""
+        if self.circuit == "closed":
+            return True
+        if self.circuit == "open":
+            return now >= self.down_until
+        return now - self.probe_started >= PROBE_TIMEOUT
+
+    def has_capacity(self):
+        aimd = self.throttle.concurrency
+        return aimd.in_flight < int(aimd.limit)
+
+    def weight(self):
+        return max(0.01, 1.0 - self.error_rate) / max(self.latency, 0.001)
+
+class EndpointPool:
+    """Weighted, health-checked selection across several RPC endpoints"""
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def pick(self, exclude=()):
+        """Choose an endpoint for the next request, avoiding `exclude` when possible"""
+        with self.lock:
+            now = time.time()
+            candidates = [e for e in self.endpoints if e not in exclude and e.is_healthy(now)]
+            if not candidates:
+                candidates = [e for e in self.endpoints if e.is_healthy(now)]
+            if not candidates:
+                # Everything is down: try whichever comes back soonest
+                return min(self.endpoints, key=lambda e: e.down_until)
+
+            # Fill endpoints with free slots first; overflow to the rest
+            free = [e for e in candidates if e.has_capacity()]
+            candidates = free or candidates
+            endpoint = random.choices(candidates, weights=[e.weight() for e in candidates])[0]
+            if endpoint.circuit != "closed":
+                # This request is the health check; hold off everyone else
+                endpoint.circuit = "half-open"
+                endpoint.probe_started = now
+            return endpoint
+
+    def report(self, endpoint, ok, latency):
+        """Update an endpoint's statistics after a request"""
+        with self.lock:
+            endpoint.error_rate = 0.9 * endpoint.error_rate + (0.0 if ok else 0.1)
+            if ok:
+                endpoint.latency = 0.8 * endpoint.latency + 0.2 * latency
+                endpoint.failures = 0
+                endpoint.cooldown = BASE_COOLDOWN
+                endpoint.circuit = "closed"
+                return
+
+            endpoint.failures += 1
+            # A failed health check reopens the circuit straight away
+            if endpoint.failures >= MAX_FAILURES or endpoint.circuit == "half-open":
+                endpoint.circuit = "open"
+                endpoint.down_until = time.time() + endpoint.cooldown
+                print(f"  Endpoint {endpoint.name} unhealthy, retrying it in {endpoint.cooldown:.0f}s")
+                endpoint.cooldown = min(MAX_COOLDOWN, endpoint.cooldown * 2)
+                endpoint.failures = 0
+
+    def check_health(self):
+        """Probe every endpoint with eth_blockNumber; returns {name: latest block or error}"""
+        status = {}
+        payload = {"id": 1, "jsonrpc": "2.0", "method": "eth_blockNumber", "params": []}
+        for endpoint in self.endpoints:
+            started = time.time()
+            try:
+                result = post_json(endpoint.url, payload, timeout=10)
+                ok = "result" in result
+                status[endpoint.name] = int(result["result"], 16) if ok else result.get("error")
+            except Exception as e:
+                ok = False
+                status[endpoint.name] = str(e)
+            # A failed probe takes the endpoint straight out of rotation
+            for _ in range(1 if ok else MAX_FAILURES):
+                self.report(endpoint, ok, time.time() - started)
+        return status
+
+    def share_budget(self, fraction):
+        """Scale every endpoint's CU budget, e.g. when several processes share one plan"""
+        for endpoint in self.endpoints:
+            bucket = endpoint.throttle.bucket
+            bucket.rate *= fraction
+            bucket.capacity *= fraction
+            bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+    @property
+    def cu_spent(self):
+        return sum(e.throttle.cu_spent for e in self.endpoints)
+
+    def cu_per_second(self):
+        return sum(e.throttle.cu_per_second() for e in self.endpoints)
+
+def parse_endpoints(spec, default_cu_per_second, max_concurrency):
+    """
+    Build endpoints from a comma-separated list of URLs. Each entry may end
+    in "|<CU per second>"; use 0 for nodes without a CU budget.
+    """
+    endpoints = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, cu = entry.partition("|")
+        endpoints.append(Endpoint(url.strip(), int(cu) if cu else default_cu_per_second, max_concurrency))
+    return endpoints
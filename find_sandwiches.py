@@ -6,27 +6,45 @@ Scans blocks from 2022-2024 and saves results to CSV with Etherscan links.
 Based on the heuristics from the MEV white paper (Appendix A.1)
 """
 
-import requests
+import argparse
+import asyncio
+import bisect
 import json
 import csv
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 from dotenv import load_dotenv
 
+import batch_detect
+from address_table import AddressTable
+from checkpoint import read_checkpoint, restore_output, write_checkpoint
+from coverage import Coverage
+from csv_schema import CSV_COLUMNS
+from density_index import DensityIndex
+from endpoint_pool import EndpointPool, Endpoint, parse_endpoints
+from hedging import LatencyTracker, hedged
+from rpc_cache import RPCCache
+from retry_queue import RetryQueue, backoff_delay
+from rpc_transport import post_json
+from swap_table import SwapTable
+from timestamp_index import TimestampIndex, find_block_at_time
+from window_sizer import WindowSizer
+
 # Load from .env file if it exists
 load_dotenv()
 
 # Load Alchemy API key from environment variable
 ALCHEMY_KEY = os.environ.get("ALCHEMY_KEY")
-if not ALCHEMY_KEY:
-    print("ERROR: Please set the ALCHEMY_KEY environment variable")
-    print("  Option 1: Create a .env file with: ALCHEMY_KEY=your_key_here")
-    print("  Option 2: export ALCHEMY_KEY=your_key_here")
-    exit(1)
+ALCHEMY_URL = f"https://eth-mainnet.g.alchemy.com/v2/{ALCHEMY_KEY}" if ALCHEMY_KEY else None
 
-ALCHEMY_URL = f"https://eth-mainnet.g.alchemy.com/v2/{ALCHEMY_KEY}"
+# Extra RPC endpoints (local archive nodes, other providers), comma-separated.
+# Append "|<CU per second>" to pace a hosted endpoint; bare URLs are unthrottled.
+#   RPC_ENDPOINTS=http://192.168.68.62:8545,https://other.provider/key|500
+RPC_ENDPOINTS = os.environ.get("RPC_ENDPOINTS", "")
 
 # Uniswap V2 Swap event topic
 SWAP_TOPIC = "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
@@ -38,294 +56,1029 @@ END_BLOCK = 21525419     # Dec 31, 2024
 # Output files
 OUTPUT_CSV = "sandwiches.csv"
 PROGRESS_FILE = "progress.txt"
+WINDOW_SIZES_FILE = "window_sizes.json"
+DENSITY_FILE = "swap_density.json"
+TIMESTAMP_INDEX_FILE = "block_timestamps.bin"
+ADDRESS_TABLE_FILE = "addresses.bin"
+
+# NOTE: Free-tier Alchemy only allows eth_getLogs over a 10-block range.
+# If you upgrade your plan, you can safely increase this to speed up scanning.
+BATCH_SIZE = 10  # Initial blocks per batch (must be <= 10 on free tier)
+
+# Windows start at BATCH_SIZE and adapt to swap density, up to this many blocks.
+# Ranges the provider rejects are bisected automatically, so this is safe to
+# leave high even on the free tier.
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "2000"))
+
+# Number of eth_getLogs windows kept in flight at once.
+# Raise this (e.g. SCAN_CONCURRENCY=32 in .env) if your plan allows more throughput.
+SCAN_CONCURRENCY = int(os.environ.get("SCAN_CONCURRENCY", "8"))
+
+# Scan pipeline (fetch -> detect -> timestamps -> write): worker threads for the
+# CPU-bound decode/detect stage and the header-fetching timestamp stage
+DETECT_WORKERS = int(os.environ.get("DETECT_WORKERS", "2"))
+TIMESTAMP_WORKERS = int(os.environ.get("TIMESTAMP_WORKERS", "4"))
+# Windows each queue between two stages can hold
+PIPELINE_BUFFER = int(os.environ.get("PIPELINE_BUFFER", "16"))
+
+# Windows fetched ahead of the one being written: at most PREFETCH_DEPTH
+# windows (in flight or waiting), and no new fetches once the fetched logs
+# are estimated to take PREFETCH_MEMORY_MB
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", "16"))
+PREFETCH_MEMORY_MB = int(os.environ.get("PREFETCH_MEMORY_MB", "512"))
+
+# Rough memory per fetched log (decoded JSON), for the prefetch budget
+LOG_BYTES = 2048
+
+# Windows whose fetch failed after every retry are queued (see retry_queue.py)
+# and fetched again at the end of the scan, each up to RETRY_ROUNDS more times
+# per run with exponential backoff; leftovers are retried by the next run
+RETRY_ROUNDS = int(os.environ.get("RETRY_ROUNDS", "5"))
+
+# Backoff between attempts inside one RPC call, once every endpoint has failed
+RPC_RETRY_DELAY = 1.0
+RPC_MAX_RETRY_DELAY = 30.0
+
+# Seconds between checkpoints (CSV fsync + atomic progress file update). A
+# crash loses at most this much work, which is rescanned on resume.
+CHECKPOINT_SECONDS = float(os.environ.get("CHECKPOINT_SECONDS", "5"))
+
+# Max calls packed into one JSON-RPC batch request (providers cap batch size)
+RPC_BATCH_LIMIT = 100
+
+# Compute units per second allowed by your provider plan (Alchemy free tier: 330).
+# RPC calls are paced to this budget, and concurrency backs off on 429s.
+CU_PER_SECOND = int(os.environ.get("CU_PER_SECOND", "330"))
+
+# Hedged requests: if a call is slower than this learned latency percentile,
+# send it again to another endpoint and take whichever answers first.
+# Costs roughly (100 - HEDGE_PERCENTILE)% extra requests.
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+
+# On-disk cache of historical RPC responses (logs and headers of finalized blocks):
+#   RPC_CACHE=on (default), readonly (serve hits, never write) or off
+RPC_CACHE = os.environ.get("RPC_CACHE", "on").lower()
+RPC_CACHE_DIR = os.environ.get("RPC_CACHE_DIR", "rpc_cache")
+RPC_CACHE_MAX_GB = float(os.environ.get("RPC_CACHE_MAX_GB", "10"))
+
+# Detection engine: "numpy" runs the vectorized batch engine over each window
+# (batch_detect.py), "python" runs find_sandwiches_in_block per block, and
+# "auto" (default) uses numpy when it is installed. Results are identical.
+DETECT_ENGINE = os.environ.get("DETECT_ENGINE", "auto").lower()
+
+# Blocks this far behind the chain head are final and safe to cache
+FINALITY_DEPTH = 128
 
 # Etherscan base URL
 ETHERSCAN_TX = "https://etherscan.io/tx/"
 
-def rpc_call(method, params=None, retries=3):
-    """Make a JSON-RPC call to Alchemy with retry logic"""
+# Every RPC call goes through this pool, each endpoint with its own CU budget
+# and adaptive concurrency
+endpoint_pool = EndpointPool(
+    ([Endpoint(ALCHEMY_URL, CU_PER_SECOND, SCAN_CONCURRENCY)] if ALCHEMY_URL else [])
+    + parse_endpoints(RPC_ENDPOINTS, 0, SCAN_CONCURRENCY)
+)
+
+# Per-method response times, used to decide when to hedge
+latencies = LatencyTracker()
+hedge_executor = ThreadPoolExecutor(max_workers=2 * SCAN_CONCURRENCY)
+
+rpc_cache = None if RPC_CACHE == "off" else RPCCache(
+    RPC_CACHE_DIR, int(RPC_CACHE_MAX_GB * 1e9), read_only=RPC_CACHE == "readonly"
+)
+
+class RPCFailed(Exception):
+    """Every attempt of an RPC call failed"""
+
+class FetchCancelled(Exception):
+    """A window fetch was abandoned because the scan is shutting down"""
+
+class WindowTooLarge(Exception):
+    """The provider rejected an eth_getLogs range as too large, or timed out on it"""
+
+class WindowTimedOut(WindowTooLarge):
+    """An eth_getLogs range timed out (maybe too large, maybe a slow moment)"""
+
+def is_window_too_large(error):
+    """Check whether an RPC error means the block range or result set was too big"""
+    message = str(error.get("message", "")).lower() if isinstance(error, dict) else str(error).lower()
+    return any(hint in message for hint in (
+        "more than",          # "query returned more than 10000 results"
+        "too many results",
+        "response size",      # Alchemy: "Log response size exceeded"
+        "block range",        # "you can make eth_getLogs requests with up to a 10 block range"
+        "range is too large",
+        "range too large",
+    ))
+
+def send_to(endpoint, method, payload):
+    """Send one JSON-RPC request to one endpoint, recording its latency and health"""
+    started = time.time()
+    try:
+        result = endpoint.throttle.send([method], lambda: post_json(endpoint.url, payload, timeout=30))
+    except Exception:
+        endpoint_pool.report(endpoint, False, time.time() - started)
+        raise
+    
+    elapsed = time.time() - started
+    # A range the provider won't serve is our problem, not the endpoint's
+    ok = "error" not in result or is_window_too_large(result["error"])
+    endpoint_pool.report(endpoint, ok, elapsed)
+    if "error" not in result:
+        latencies.record(method, elapsed)
+    return result
+
+def hedged_send(endpoint, method, payload):
+    """
+    send_to() one endpoint, and if it is slower than the learned
+    HEDGE_PERCENTILE latency, race the same request on a second one
+    """
+    delay = latencies.percentile(method, HEDGE_PERCENTILE)
+    if delay is None:
+        return send_to(endpoint, method, payload)
+    # The backup is only picked if the hedge fires: pick() may claim a
+    # recovering endpoint's health check. With a single endpoint the hedge
+    # goes out on another pooled connection.
+    return hedged(
+        lambda: send_to(endpoint, method, payload),
+        lambda: send_to(endpoint_pool.pick(exclude={endpoint}), method, payload),
+        delay,
+        hedge_executor
+    )
+
+_latest_block = None
+
+def latest_block():
+    """Chain head (fetched once; the head only moves forward), or None if unavailable"""
+    global _latest_block
+    if _latest_block is None:
+        try:
+            result = rpc_call("eth_blockNumber")
+        except RPCFailed:
+            return None
+        if isinstance(result.get("result"), str):
+            _latest_block = int(result["result"], 16)
+    return _latest_block
+
+def finalized_block():
+    """Highest block we treat as final"""
+    latest = latest_block()
+    return latest - FINALITY_DEPTH if latest is not None else -1
+
+def is_final(method, params):
+    """Whether a call only touches finalized blocks, so its result can never change"""
+    try:
+        if method == "eth_getLogs":
+            return int(params[0]["toBlock"], 16) <= finalized_block()
+        if method == "eth_getBlockByNumber":
+            return int(params[0], 16) <= finalized_block()
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass  # "latest", block hashes, etc.
+    return False
+
+def cache_result(method, params, result):
+    """Store a successful response in the RPC cache if it is immutable"""
+    if rpc_cache is not None and not rpc_cache.read_only and is_final(method, params):
+        rpc_cache.put(method, params, result)
+
+def rpc_call(method, params=None, retries=3, raise_too_large=False):
+    """
+    Make a JSON-RPC call with retry logic, failing over to another endpoint
+    in the pool after an error. With raise_too_large, range/result-size
+    errors and timeouts raise WindowTooLarge instead of being retried.
+    Raises RPCFailed once every attempt has failed.
+    Historical results are served from and saved to the RPC cache.
+    """
+    params = params or []
+    if rpc_cache is not None:
+        cached = rpc_cache.get(method, params)
+        if cached is not None:
+            return {"result": cached}
+    
     payload = {
         "id": 1,
         "jsonrpc": "2.0",
         "method": method,
-        "params": params or []
+        "params": params
     }
+    send = hedged_send if HEDGE_REQUESTS else send_to
     
+    tried = set()
+    error = None
     for attempt in range(retries):
+        endpoint = endpoint_pool.pick(exclude=tried)
+        tried.add(endpoint)
+        # Fail over straight away; only back off once every endpoint has failed
+        backoff = backoff_delay(attempt, RPC_RETRY_DELAY, RPC_MAX_RETRY_DELAY) if len(tried) >= len(endpoint_pool) else 0
         try:
-            response = requests.post(
-                ALCHEMY_URL,
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=30
-            )
-            result = response.json()
+            result = send(endpoint, method, payload)
             if "error" in result:
-                print(f"  RPC Error: {result['error']}")
-                time.sleep(1)
+                if raise_too_large and is_window_too_large(result["error"]):
+                    raise WindowTooLarge(result["error"])
+                print(f"  RPC Error ({endpoint.name}): {result['error']}")
+                error = result["error"]
+                time.sleep(backoff)
                 continue
+            cache_result(method, params, result["result"])
             return result
+        except WindowTooLarge:
+            raise
+        except TimeoutError as e:
+            if raise_too_large:
+                raise WindowTimedOut(e)
+            print(f"  Request failed ({endpoint.name}, attempt {attempt + 1}): {e}")
+            error = e
+            time.sleep(backoff)
         except Exception as e:
-            print(f"  Request failed (attempt {attempt + 1}): {e}")
-            time.sleep(2)
+            print(f"  Request failed ({endpoint.name}, attempt {attempt + 1}): {e}")
+            error = e
+            time.sleep(backoff)
     
-    return {"result": []}
+    raise RPCFailed(f"{method} failed after {retries} attempts: {error}")
 
-def get_swap_logs(from_block, to_block):
-    """Fetch all Uniswap V2 Swap events in a block range"""
-    result = rpc_call("eth_getLogs", [{
+def rpc_batch(calls, retries=3):
+    """
+    Make many JSON-RPC calls with as few HTTP requests as possible.
+    `calls` is a list of (method, params) tuples. Returns one response per
+    call, in the same order. Only the members that failed are retried,
+    and members already in the RPC cache are never sent.
+    """
+    responses = [None] * len(calls)
+    todo = []
+    for i, (method, params) in enumerate(calls):
+        cached = rpc_cache.get(method, params or []) if rpc_cache is not None else None
+        if cached is not None:
+            responses[i] = {"result": cached}
+        else:
+            todo.append(i)
+    
+    tried = set()
+    for attempt in range(retries):
+        failed = []
+        for start in range(0, len(todo), RPC_BATCH_LIMIT):
+            chunk = todo[start:start + RPC_BATCH_LIMIT]
+            endpoint = endpoint_pool.pick(exclude=tried)
+            payload = [{
+                "id": i,
+                "jsonrpc": "2.0",
+                "method": calls[i][0],
+                "params": calls[i][1] or []
+            } for i in chunk]
+            
+            started = time.time()
+            try:
+                results = endpoint.throttle.send(
+                    [calls[i][0] for i in chunk],
+                    lambda: post_json(endpoint.url, payload, timeout=30)
+                )
+            except Exception as e:
+                endpoint_pool.report(endpoint, False, time.time() - started)
+                tried.add(endpoint)
+                print(f"  Batch request failed ({endpoint.name}, attempt {attempt + 1}): {e}")
+                failed.extend(chunk)
+                continue
+            
+            # A single error object means the whole batch was rejected
+            if not isinstance(results, list):
+                endpoint_pool.report(endpoint, False, time.time() - started)
+                tried.add(endpoint)
+                print(f"  RPC Error ({endpoint.name}): {results.get('error', results)}")
+                failed.extend(chunk)
+                continue
+            
+            endpoint_pool.report(endpoint, True, time.time() - started)
+            
+            # Responses may come back in any order, so match them by id
+            by_id = {r.get("id"): r for r in results}
+            for i in chunk:
+                result = by_id.get(i)
+                if result is None or "error" in result:
+                    if result is not None:
+                        print(f"  RPC Error: {result['error']}")
+                    failed.append(i)
+                else:
+                    responses[i] = result
+                    cache_result(calls[i][0], calls[i][1] or [], result["result"])
+        
+        todo = failed
+        if not todo:
+            break
+        if len(tried) >= len(endpoint_pool):
+            time.sleep(backoff_delay(attempt, RPC_RETRY_DELAY, RPC_MAX_RETRY_DELAY))
+    
+    # Only headers are batched; a missing one leaves a blank CSV timestamp
+    for i in todo:
+        responses[i] = {"result": []}
+    return responses
+
+# Learned eth_getLogs window sizes, shared by all in-flight fetches
+window_sizer = WindowSizer(BATCH_SIZE, MAX_BATCH_SIZE, WINDOW_SIZES_FILE)
+
+# Swap logs per block, learned from every window we fetch (used to plan shards)
+density_index = DensityIndex(DENSITY_FILE)
+
+# Block timestamps persisted across runs (uint32 per block from START_BLOCK)
+timestamp_index = TimestampIndex(TIMESTAMP_INDEX_FILE, START_BLOCK)
+
+# Pair and sender address ids, stable across runs and processes
+address_table = AddressTable(ADDRESS_TABLE_FILE)
+
+def get_swap_logs(from_block, to_block, cancelled=None):
+    """
+    Fetch all Uniswap V2 Swap events in a block range.
+    If the provider rejects the range as too large, it is bisected and
+    both halves are fetched separately. Raises RPCFailed if the range
+    can't be fetched, and FetchCancelled once the `cancelled` event is set,
+    instead of starting another request.
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise FetchCancelled()
+    log_filter = {
         "fromBlock": hex(from_block),
         "toBlock": hex(to_block),
         "topics": [SWAP_TOPIC]
-    }])
-    return result.get("result", [])
+    }
+    if rpc_cache is not None:
+        # Cached windows from earlier runs rarely line up exactly with this one
+        cached = rpc_cache.get_logs(log_filter, from_block, to_block)
+        if cached is not None:
+            return cached
+    
+    size = to_block - from_block + 1
+    started = time.time()
+    try:
+        result = rpc_call("eth_getLogs", [log_filter], raise_too_large=size > 1)
+    except WindowTooLarge as e:
+        # Only an explicit rejection caps the region's window size for good
+        window_sizer.record_too_large(from_block, size, rejected=not isinstance(e, WindowTimedOut))
+        mid = (from_block + to_block) // 2
+        return get_swap_logs(from_block, mid, cancelled) + get_swap_logs(mid + 1, to_block, cancelled)
+    
+    logs = result.get("result", [])
+    window_sizer.record_success(from_block, size, len(logs), time.time() - started)
+    return logs
 
 def get_block_timestamp(block_num):
     """Get timestamp for a block"""
-    result = rpc_call("eth_getBlockByNumber", [hex(block_num), False])
+    ts = timestamp_index.get(block_num)
+    if ts:
+        return ts
+    try:
+        result = rpc_call("eth_getBlockByNumber", [hex(block_num), False])
+    except RPCFailed:
+        return 0
     if result.get("result"):
-        return int(result["result"]["timestamp"], 16)
+        ts = int(result["result"]["timestamp"], 16)
+        timestamp_index.set(block_num, ts)
+        return ts
     return 0
 
-def parse_swap_event(log):
-    """Parse a Swap event log into structured data"""
-    data = log["data"][2:]  # Remove '0x' prefix
-    
-    amount0In = int(data[0:64], 16)
-    amount1In = int(data[64:128], 16)
-    amount0Out = int(data[128:192], 16)
-    amount1Out = int(data[192:256], 16)
-    
-    # Determine swap direction
-    direction = 0 if amount0In > 0 else 1
-    
-    return {
-        "tx_hash": log["transactionHash"],
-        "tx_index": int(log["transactionIndex"], 16),
-        "log_index": int(log["logIndex"], 16),
-        "pair": log["address"].lower(),
-        "sender": "0x" + log["topics"][1][26:].lower(),
-        "to": "0x" + log["topics"][2][26:].lower(),
-        "amount0In": amount0In,
-        "amount1In": amount1In,
-        "amount0Out": amount0Out,
-        "amount1Out": amount1Out,
-        "direction": direction,
-        "block": int(log["blockNumber"], 16)
-    }
+def get_block_timestamps(block_nums):
+    """Get timestamps for many blocks using batched requests"""
+    block_nums = list(block_nums)
+    results = rpc_batch([("eth_getBlockByNumber", [hex(b), False]) for b in block_nums])
+    
+    timestamps = {}
+    for block_num, result in zip(block_nums, results):
+        timestamps[block_num] = int(result["result"]["timestamp"], 16) if result.get("result") else 0
+    return timestamps
+
+def prefetch_timestamps(block_nums):
+    """Fill the timestamp index for every block in block_nums, with batched header fetches"""
+    missing = timestamp_index.missing(sorted(set(block_nums)))
+    if missing:
+        for block_num, ts in get_block_timestamps(missing).items():
+            timestamp_index.set(block_num, ts)
+
+def index_log_timestamps(logs):
+    """Record block timestamps from logs that carry them (some nodes add blockTimestamp)"""
+    for log in logs:
+        if "blockTimestamp" in log:
+            timestamp_index.set(int(log["blockNumber"], 16), int(log["blockTimestamp"], 16))
+
+def parse_date(text):
+    """Parse an ISO date or datetime; naive values are taken as UTC"""
+    when = datetime.fromisoformat(text)
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+def block_at_time(when):
+    """
+    First block mined at or after a UTC datetime, found by searching block
+    timestamps (index first, then headers). Returns (block, header lookups).
+    """
+    def timestamp(block_num):
+        ts = get_block_timestamp(block_num)
+        if not ts:
+            raise RuntimeError(f"Could not fetch the timestamp of block {block_num:,}")
+        return ts
 
-def find_sandwiches_in_block(swaps):
-    """Find sandwich attacks in a list of swaps from the same block."""
+    latest = latest_block()
+    if latest is None:
+        raise RuntimeError("Could not fetch the latest block number")
+    return find_block_at_time(int(when.timestamp()), timestamp, 1, latest)
+
+# Relative tolerance between the frontrun's output and the backrun's input
+AMOUNT_TOLERANCE = 0.001
+
+# A sandwich needs a frontrun, a victim and a backrun on the same pair
+MIN_PAIR_SWAPS = 3
+
+def find_sandwiches_in_pair(swaps, pair_rows):
+    """
+    Find sandwiches among one pair's swaps (SwapTable rows sorted by
+    (tx_index, log_index)).
+
+    A backrun is a later swap (at least two positions on) by the same sender
+    in the other direction, whose input matches the frontrun's output within
+    AMOUNT_TOLERANCE; victims are the same-direction swaps in between, from
+    other transactions. Swaps are indexed by (sender, direction) and sorted
+    by input amount, so backrun candidates are a range lookup instead of a
+    scan, and victims are sliced from per-direction position lists.
+    """
+    sender, direction, tx = swaps.sender, swaps.direction, swaps.tx
+    amount_in, amount_out = swaps.amount_in, swaps.amount_out
+    
+    # (sender, direction) -> input amounts (sorted) and their positions
+    by_key = defaultdict(list)
+    # direction -> positions of swaps in that direction (ascending)
+    by_direction = ([], [])
+    for pos, row in enumerate(pair_rows):
+        by_key[(sender[row], direction[row])].append((amount_in[row], pos))
+        by_direction[direction[row]].append(pos)
+    amounts = {}
+    for key, entries in by_key.items():
+        entries.sort()
+        amounts[key] = [amount for amount, _ in entries]
+    
+    sandwiches = []
+    for i, frontrun in enumerate(pair_rows):
+        key = (sender[frontrun], 1 - direction[frontrun])
+        if key not in by_key:
+            continue
+        frontrun_out = amount_out[frontrun]
+        
+        # Candidate inputs within the tolerance, widened so float rounding
+        # never drops a match; the exact check below decides
+        lo = bisect.bisect_left(amounts[key], int(frontrun_out / (1 + AMOUNT_TOLERANCE * 1.1)))
+        hi = bisect.bisect_right(amounts[key], int(frontrun_out / (1 - AMOUNT_TOLERANCE * 1.1)) + 1)
+        backruns = sorted(pos for _, pos in by_key[key][lo:hi] if pos >= i + 2)
+        
+        same_direction = by_direction[direction[frontrun]]
+        for k in backruns:
+            backrun = pair_rows[k]
+            backrun_in = amount_in[backrun]
+            if backrun_in == 0 or abs(frontrun_out - backrun_in) / backrun_in > AMOUNT_TOLERANCE:
+                continue
+            
+            between = same_direction[bisect.bisect_right(same_direction, i):bisect.bisect_left(same_direction, k)]
+            victims = [pair_rows[j] for j in between
+                       if tx[pair_rows[j]] != tx[frontrun] and tx[pair_rows[j]] != tx[backrun]]
+            
+            if victims:
+                sandwiches.append({
+                    "block": swaps.block[frontrun],
+                    "frontrun": frontrun,
+                    "backrun": backrun,
+                    "victims": victims,
+                    "revenue_raw": amount_out[backrun] - amount_in[frontrun],
+                })
+    
+    return sandwiches
+
+def find_sandwiches_in_block(swaps, rows):
+    """Find sandwich attacks among SwapTable rows from the same block."""
     sandwiches = []
     
     by_pair = defaultdict(list)
-    for swap in swaps:
-        by_pair[swap["pair"]].append(swap)
+    for row in rows:
+        by_pair[swaps.pair[row]].append(row)
     
-    for pair, pair_swaps in by_pair.items():
-        if len(pair_swaps) < 3:
+    for pair_rows in by_pair.values():
+        if len(pair_rows) < MIN_PAIR_SWAPS:
             continue
         
-        pair_swaps.sort(key=lambda x: (x["tx_index"], x["log_index"]))
-        
-        for i, frontrun in enumerate(pair_swaps):
-            for k in range(i + 2, len(pair_swaps)):
-                backrun = pair_swaps[k]
-                
-                if frontrun["sender"] != backrun["sender"]:
-                    continue
-                
-                if frontrun["direction"] == backrun["direction"]:
-                    continue
-                
-                if frontrun["direction"] == 0:
-                    frontrun_out = frontrun["amount1Out"]
-                    backrun_in = backrun["amount1In"]
-                    revenue_raw = backrun["amount0Out"] - frontrun["amount0In"]
-                else:
-                    frontrun_out = frontrun["amount0Out"]
-                    backrun_in = backrun["amount0In"]
-                    revenue_raw = backrun["amount1Out"] - frontrun["amount1In"]
-                
-                if backrun_in == 0 or abs(frontrun_out - backrun_in) / backrun_in > 0.001:
-                    continue
-                
-                victims = []
-                for j in range(i + 1, k):
-                    victim = pair_swaps[j]
-                    if victim["direction"] == frontrun["direction"]:
-                        if victim["tx_hash"] != frontrun["tx_hash"] and victim["tx_hash"] != backrun["tx_hash"]:
-                            victims.append(victim)
-                
-                if victims:
-                    sandwiches.append({
-                        "block": frontrun["block"],
-                        "pair": pair,
-                        "attacker": frontrun["sender"],
-                        "frontrun_tx": frontrun["tx_hash"],
-                        "backrun_tx": backrun["tx_hash"],
-                        "victim_txs": [v["tx_hash"] for v in victims],
-                        "num_victims": len(victims),
-                        "revenue_raw": revenue_raw,
-                    })
+        pair_rows.sort(key=lambda row: (swaps.tx_index[row], swaps.log_index[row]))
+        sandwiches.extend(find_sandwiches_in_pair(swaps, pair_rows))
     
     return sandwiches
 
-def init_csv():
+def init_csv(path=OUTPUT_CSV):
     """Initialize CSV file with headers if it doesn't exist"""
-    if not os.path.exists(OUTPUT_CSV):
-        with open(OUTPUT_CSV, 'w', newline='') as f:
+    if not os.path.exists(path):
+        with open(path, 'w', newline='') as f:
             writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+        print(f"Created {path}")
+
+def write_sandwiches(writer, sandwiches, swaps):
+    """
+    Write sandwich records with a csv.writer. Sandwiches refer to rows of
+    the SwapTable they were found in; timestamps come from the timestamp index.
+    """
+    for s in sandwiches:
+        ts = timestamp_index.get(s["block"])
+        dt_str = datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if ts else ""
+        frontrun_tx = swaps.tx_hash(s["frontrun"])
+        backrun_tx = swaps.tx_hash(s["backrun"])
+        
+        # Write one row per victim
+        for victim in s["victims"]:
+            victim_tx = swaps.tx_hash(victim)
+            # Convert revenue from wei to ETH (divide by 10^18)
+            revenue_eth = s["revenue_raw"] / 1e18
             writer.writerow([
-                'frontrun_etherscan',
-                'victim_etherscan', 
-                'backrun_etherscan',
-                'block_number',
-                'timestamp',
-                'datetime_utc',
-                'pair_address',
-                'attacker_address',
-                'frontrun_tx',
-                'victim_tx',
-                'backrun_tx',
-                'num_victims',
-                'revenue_eth',
-                'revenue_raw'
+                f'{ETHERSCAN_TX}{frontrun_tx}',
+                f'{ETHERSCAN_TX}{victim_tx}',
+                f'{ETHERSCAN_TX}{backrun_tx}',
+                s["block"],
+                ts,
+                dt_str,
+                swaps.pair_address(s["frontrun"]),
+                swaps.sender_address(s["frontrun"]),
+                frontrun_tx,
+                victim_tx,
+                backrun_tx,
+                len(s["victims"]),
+                f"{revenue_eth:.6f}",
+                s["revenue_raw"]
             ])
-        print(f"Created {OUTPUT_CSV}")
-
-def append_to_csv(sandwiches, block_timestamps):
-    """Append sandwich records to CSV"""
-    with open(OUTPUT_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        for s in sandwiches:
-            ts = block_timestamps.get(s["block"], 0)
-            dt_str = datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if ts else ""
+
+def save_progress(coverage, path=PROGRESS_FILE, output_bytes=None, failed=()):
+    """
+    Atomically save a checkpoint: the scanned block ranges, the CSV length
+    they cover, and the failed windows still to retry (see checkpoint.py)
+    """
+    write_checkpoint(path, {"covered": coverage.intervals(), "output_bytes": output_bytes, "failed": list(failed)})
+
+def load_checkpoint(path=PROGRESS_FILE, start_block=None):
+    """
+    Load the checkpoint ({"coverage", "output_bytes", "failed"}), or a fresh
+    one. start_block (START_BLOCK by default) is where the scan began, for
+    progress files that only hold the next block.
+    """
+    start_block = start_block if start_block is not None else START_BLOCK
+    checkpoint = read_checkpoint(path) or {"covered": [], "output_bytes": None, "failed": []}
+    if "covered" in checkpoint:
+        coverage = Coverage(checkpoint["covered"])
+    else:
+        # Saved by an in-order scan: everything before next_block is done
+        coverage = Coverage([(start_block, checkpoint["next_block"] - 1)])
+    return {"coverage": coverage, "output_bytes": checkpoint["output_bytes"], "failed": checkpoint["failed"]}
+
+def load_progress(path=PROGRESS_FILE, start_block=None):
+    """Load the scanned block ranges (a Coverage) from the progress file"""
+    return load_checkpoint(path, start_block)["coverage"]
+
+class ScanOutput:
+    """The CSV a scan appends to, cut back to and committed with its checkpoint"""
+    
+    def __init__(self, state, output_csv=OUTPUT_CSV, progress_file=PROGRESS_FILE, start_block=START_BLOCK):
+        checkpoint = load_checkpoint(progress_file, start_block)
+        dropped = restore_output(output_csv, checkpoint["output_bytes"])
+        if dropped:
+            print(f"Dropped {dropped:,} bytes of {output_csv} written after the last checkpoint")
+        self.state = state
+        self.progress_file = progress_file
+        self.coverage = state["coverage"] = checkpoint["coverage"]
+        self.retry_queue = RetryQueue(checkpoint["failed"])
+        self.file = open(output_csv, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        self.last_commit = time.time()
+        if checkpoint["output_bytes"] is None:
+            # First run (or a legacy progress file): take the CSV as it is
+            self.commit()
+    
+    def write(self, sandwiches, swaps):
+        write_sandwiches(self.writer, sandwiches, swaps)
+        self.state["total_sandwiches"] += len(sandwiches)
+    
+    def commit(self):
+        """Make the rows written so far durable, then checkpoint them"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        save_progress(self.coverage, self.progress_file, self.file.tell(), self.retry_queue.dump())
+        self.last_commit = time.time()
+    
+    def commit_every(self, seconds=CHECKPOINT_SECONDS):
+        """commit() if the last one is older than `seconds`"""
+        if time.time() - self.last_commit >= seconds:
+            self.commit()
+    
+    def close(self):
+        """Close without committing: rows after the last commit are dropped on resume"""
+        self.file.close()
+
+def prefilter_logs(logs):
+    """
+    Drop logs on pairs with fewer than MIN_PAIR_SWAPS swaps in their block,
+    which can't be part of a sandwich. Groups by the raw blockNumber and
+    address strings, so nothing is decoded for them.
+    """
+    keys = [(log["blockNumber"], log["address"]) for log in logs]
+    counts = Counter(keys)
+    return [log for log, key in zip(logs, keys) if counts[key] >= MIN_PAIR_SWAPS]
+
+def use_batch_engine():
+    """Whether to run the vectorized engine (see DETECT_ENGINE)"""
+    if DETECT_ENGINE == "python":
+        return False
+    if DETECT_ENGINE == "numpy" and not batch_detect.available():
+        raise RuntimeError("DETECT_ENGINE=numpy needs numpy (pip install numpy)")
+    return batch_detect.available()
+
+def detect_logs(logs):
+    """
+    Decode a batch of swap logs and find sandwiches in each block (block
+    timestamps carried on the logs are indexed on the way).
+    Returns (SwapTable, sandwiches, blocks with a sandwich).
+    """
+    index_log_timestamps(logs)
+    swaps = SwapTable.from_logs(prefilter_logs(logs), address_table)
+    
+    if use_batch_engine():
+        batch_sandwiches = batch_detect.find_sandwiches_batch(swaps, AMOUNT_TOLERANCE)
+        sandwich_blocks = {s["block"] for s in batch_sandwiches}
+    else:
+        batch_sandwiches = []
+        sandwich_blocks = []
+        for block_num, rows in swaps.rows_by_block().items():
+            sandwiches = find_sandwiches_in_block(swaps, rows)
+            if sandwiches:
+                sandwich_blocks.append(block_num)
+                batch_sandwiches.extend(sandwiches)
+    
+    return swaps, batch_sandwiches, sandwich_blocks
+
+class PrefetchBudget:
+    """
+    Limits the windows fetched ahead of the writer, by count (in flight or
+    waiting to be written) and by the estimated memory of their logs
+    """
+    
+    def __init__(self, depth, max_bytes):
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.windows = 0
+        self.bytes = 0
+        self.changed = asyncio.Condition()
+    
+    def has_room(self):
+        # One window is always allowed, so the scan can't stall
+        return self.windows == 0 or (self.windows < self.depth and self.bytes < self.max_bytes)
+    
+    async def reserve(self):
+        """Wait for room, then count one more window"""
+        async with self.changed:
+            await self.changed.wait_for(self.has_room)
+            self.windows += 1
+    
+    def add_bytes(self, nbytes):
+        self.bytes += nbytes
+    
+    async def release(self, nbytes):
+        """A window was written: free its slot and memory"""
+        async with self.changed:
+            self.windows -= 1
+            self.bytes -= nbytes
+            self.changed.notify_all()
+
+async def fetch_windows(ranges, concurrency=SCAN_CONCURRENCY, budget=None, whole_windows=False):
+    """
+    Fetch swap logs for (from_block, to_block) ranges in adaptive windows,
+    yielding (from_block, to_block, logs, error) as each one completes
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    cancelled = threading.Event()
+    ranges = deque(ranges)
+    in_flight = {}  # future -> (from_block, to_block)
+    
+    try:
+        while in_flight or ranges:
+            # Top up the in-flight requests, as far as the budget allows
+            while len(in_flight) < concurrency and ranges:
+                if budget is not None:
+                    if in_flight and not budget.has_room():
+                        break
+                    await budget.reserve()
+                next_block, range_end = ranges.popleft()
+                if whole_windows:
+                    to_block = range_end
+                else:
+                    to_block = min(next_block + window_sizer.size_for(next_block) - 1, range_end)
+                if to_block < range_end:
+                    ranges.appendleft((to_block + 1, range_end))
+                future = loop.run_in_executor(executor, get_swap_logs, next_block, to_block, cancelled)
+                in_flight[future] = (next_block, to_block)
             
-            # Write one row per victim
-            for victim_tx in s["victim_txs"]:
-                # Convert revenue from wei to ETH (divide by 10^18)
-                revenue_eth = s["revenue_raw"] / 1e18
-                writer.writerow([
-                    f'{ETHERSCAN_TX}{s["frontrun_tx"]}',
-                    f'{ETHERSCAN_TX}{victim_tx}',
-                    f'{ETHERSCAN_TX}{s["backrun_tx"]}',
-                    s["block"],
-                    ts,
-                    dt_str,
-                    s["pair"],
-                    s["attacker"],
-                    s["frontrun_tx"],
-                    victim_tx,
-                    s["backrun_tx"],
-                    s["num_victims"],
-                    f"{revenue_eth:.6f}",
-                    s["revenue_raw"]
-                ])
-
-def save_progress(block_num):
-    """Save current progress to file"""
-    with open(PROGRESS_FILE, 'w') as f:
-        f.write(str(block_num))
-
-def load_progress():
-    """Load progress from file, or return START_BLOCK"""
-    if os.path.exists(PROGRESS_FILE):
-        with open(PROGRESS_FILE, 'r') as f:
-            return int(f.read().strip())
-    return START_BLOCK
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in sorted(done, key=in_flight.get):
+                from_block, to_block = in_flight.pop(future)
+                try:
+                    logs, error = future.result(), None
+                except RPCFailed as e:
+                    logs, error = None, e
+                if budget is not None and logs:
+                    budget.add_bytes(len(logs) * LOG_BYTES)
+                yield from_block, to_block, logs, error
+    finally:
+        cancelled.set()
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def print_progress(state, start_time, start_block=START_BLOCK, end_block=END_BLOCK):
+    """Print the single-line progress indicator"""
+    total_blocks = end_block - start_block + 1
+    blocks_done = state["coverage"].count(start_block, end_block)
+    progress_pct = (blocks_done / total_blocks) * 100
+    elapsed = time.time() - start_time
+    
+    # Rate from this run's blocks only, not what earlier runs scanned
+    blocks_this_run = blocks_done - state.get("blocks_at_start", 0)
+    if blocks_this_run > 0 and elapsed > 0:
+        blocks_per_sec = blocks_this_run / elapsed
+        remaining_blocks = total_blocks - blocks_done
+        eta_seconds = remaining_blocks / blocks_per_sec if blocks_per_sec > 0 else 0
+        eta_hours = eta_seconds / 3600
+        eta_str = f"ETA: {eta_hours:.1f}h"
+    else:
+        eta_str = "ETA: calculating..."
+    
+    print(f"\r[{progress_pct:5.2f}%] Blocks left: {total_blocks - blocks_done:,} | {eta_str} | "
+          f"Sandwiches: {state['total_sandwiches']:,} | CU/s: {endpoint_pool.cu_per_second():.0f}",
+          end="    ", flush=True)
+
+async def scan(state, start_time, end_block=None, output_csv=OUTPUT_CSV,
+               progress_file=PROGRESS_FILE, show_progress=True, should_stop=None,
+               start_block=START_BLOCK):
+    """
+    Scan start_block..end_block (END_BLOCK by default) minus what the
+    progress file covers, through the pipeline described in the README
+    """
+    end_block = end_block if end_block is not None else END_BLOCK
+    output = ScanOutput(state, output_csv, progress_file, start_block)
+    coverage = output.coverage
+    retry_queue = output.retry_queue
+    state["blocks_at_start"] = coverage.count(start_block, end_block)
+    
+    # Queued failed windows wait for their backoff in the retry phase;
+    # every other unscanned range is fetched now
+    queued = Coverage(coverage.intervals())
+    for from_block, to_block in retry_queue.entries:
+        queued.add(from_block, to_block)
+    ranges = queued.gaps(start_block, end_block)
+    budget = PrefetchBudget(PREFETCH_DEPTH, PREFETCH_MEMORY_MB * 2**20)
+    detect_queue = asyncio.Queue(PIPELINE_BUFFER)
+    timestamp_queue = asyncio.Queue(PIPELINE_BUFFER)
+    write_queue = asyncio.Queue(PIPELINE_BUFFER)
+    
+    async def fetch_stage():
+        count = 0
+        async for from_block, to_block, logs, error in fetch_windows(ranges, budget=budget):
+            await detect_queue.put((from_block, to_block, logs, error))
+            count += 1
+        # Tell the writer how many windows to expect
+        await write_queue.put(count)
+    
+    async def detect_stage():
+        while True:
+            from_block, to_block, logs, error = await detect_queue.get()
+            if logs is not None:
+                density_index.record(from_block, to_block, len(logs))
+            swaps, sandwiches, blocks = await asyncio.to_thread(detect_logs, logs) if logs else (None, [], [])
+            window = (from_block, to_block, len(logs or ()) * LOG_BYTES, error, swaps, sandwiches, blocks)
+            await timestamp_queue.put(window)
+    
+    async def timestamp_stage():
+        while True:
+            window = await timestamp_queue.get()
+            sandwich_blocks = window[-1]
+            if sandwich_blocks:
+                # Fetch timestamps we don't have yet, all in one batch
+                await asyncio.to_thread(prefetch_timestamps, sandwich_blocks)
+            await write_queue.put(window)
+    
+    async def write_stage():
+        try:
+            await write_windows()
+        except asyncio.CancelledError:
+            # Cancelled between windows (Ctrl+C): everything written is consistent
+            output.commit()
+            raise
+        output.commit()
+    
+    async def write_windows():
+        written = 0
+        total = None
+        while total is None or written < total:
+            window = await write_queue.get()
+            if isinstance(window, int):
+                total = window
+                continue
+            
+            from_block, to_block, nbytes, error, swaps, sandwiches, _ = window
+            written += 1
+            await budget.release(nbytes)
+            
+            if error is not None:
+                # Left out of the coverage, and queued in the same checkpoint
+                print(f"\n  Blocks {from_block:,}-{to_block:,} failed, queued for retry: {error}")
+                retry_queue.add(from_block, to_block, error)
+            else:
+                if sandwiches:
+                    output.write(sandwiches, swaps)
+                coverage.add(from_block, to_block)
+            
+            if show_progress:
+                print_progress(state, start_time, start_block, end_block)
+            output.commit_every()
+            
+            if should_stop and should_stop():
+                return
+    
+    stages = [asyncio.create_task(fetch_stage())]
+    stages += [asyncio.create_task(detect_stage()) for _ in range(DETECT_WORKERS)]
+    stages += [asyncio.create_task(timestamp_stage()) for _ in range(TIMESTAMP_WORKERS)]
+    writer = asyncio.create_task(write_stage())
+    
+    try:
+        pending = {writer, *stages}
+        while writer in pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                if task.exception():
+                    raise task.exception()
+        
+        if len(retry_queue) and not (should_stop and should_stop()):
+            await retry_failed_windows(output, should_stop)
+    finally:
+        for task in stages + [writer]:
+            task.cancel()
+        await asyncio.gather(*stages, writer, return_exceptions=True)
+        output.close()
+        state["failed_windows"] = len(retry_queue)
+
+async def retry_failed_windows(output, should_stop=None):
+    """
+    Fetch queued failed windows again, each waiting out its backoff, until
+    the queue is empty, every window has failed RETRY_ROUNDS more times, or
+    should_stop() returns True. Due windows are fetched concurrently (up to
+    SCAN_CONCURRENCY), and each is written and checkpointed as it succeeds,
+    so its sandwiches come after later blocks in the CSV.
+    """
+    retry_queue = output.retry_queue
+    print(f"\n\nRetrying {len(retry_queue)} failed windows ({retry_queue.blocks():,} blocks)...")
+    attempts = Counter()
+    while len(retry_queue) and not (should_stop and should_stop()):
+        due = [w for w in retry_queue.due() if attempts[w] < RETRY_ROUNDS]
+        if not due:
+            waiting = [e["next_retry"] for w, e in retry_queue.entries.items() if attempts[w] < RETRY_ROUNDS]
+            if not waiting:
+                break
+            # Short sleeps so a stop request is noticed
+            await asyncio.sleep(min(1.0, max(0.0, min(waiting) - time.time())))
+            continue
+        
+        attempts.update(due)
+        windows = fetch_windows(due, whole_windows=True)
+        try:
+            async for from_block, to_block, logs, error in windows:
+                if error is not None:
+                    print(f"  Blocks {from_block:,}-{to_block:,} failed again: {error}")
+                    retry_queue.add(from_block, to_block, error)
+                    output.commit()
+                    continue
+                
+                density_index.record(from_block, to_block, len(logs))
+                swaps, sandwiches, blocks = await asyncio.to_thread(detect_logs, logs) if logs else (None, [], [])
+                if blocks:
+                    await asyncio.to_thread(prefetch_timestamps, blocks)
+                if sandwiches:
+                    output.write(sandwiches, swaps)
+                # The rows, the coverage and the resolved window go into one checkpoint
+                output.coverage.add(from_block, to_block)
+                retry_queue.resolve(from_block, to_block)
+                output.commit()
+                print(f"  Blocks {from_block:,}-{to_block:,} recovered")
+                if should_stop and should_stop():
+                    break
+        finally:
+            # Cancels fetches still in flight when stopping early
+            await windows.aclose()
 
 def main():
+    parser = argparse.ArgumentParser(description="Uniswap V2 sandwich attack detector")
+    parser.add_argument("--from-date", type=parse_date,
+                        help="scan from this UTC date/time, inclusive (e.g. 2024-06-01)")
+    parser.add_argument("--to-date", type=parse_date,
+                        help="scan up to this UTC date/time, exclusive (e.g. 2024-07-01)")
+    parser.add_argument("--output", help="output CSV (default: sandwiches.csv, or one file per date range)")
+    args = parser.parse_args()
+    
+    if not len(endpoint_pool):
+        print("ERROR: Please set the ALCHEMY_KEY environment variable (or RPC_ENDPOINTS)")
+        print("  Option 1: Create a .env file with: ALCHEMY_KEY=your_key_here")
+        print("  Option 2: export ALCHEMY_KEY=your_key_here")
+        exit(1)
+    
     print("=" * 70)
     print("🥪 Sandwich Attack Detector - 2022 to 2024")
     print("=" * 70)
     
+    print("\nRPC endpoints:")
+    for name, status in endpoint_pool.check_health().items():
+        print(f"  {name}: {f'block {status:,}' if isinstance(status, int) else f'DOWN ({status})'}")
+    
+    start_block, end_block = START_BLOCK, END_BLOCK
+    output_csv, progress_file = OUTPUT_CSV, PROGRESS_FILE
+    if args.from_date or args.to_date:
+        # Each date range gets its own output and progress file, so
+        # incremental jobs (e.g. one per month) don't clobber each other
+        lookups = 0
+        if args.from_date:
+            start_block, n = block_at_time(args.from_date)
+            lookups += n
+        if args.to_date:
+            first_after, n = block_at_time(args.to_date)
+            end_block = first_after - 1
+            lookups += n
+        else:
+            end_block = finalized_block()
+        from_label = args.from_date.strftime("%Y%m%d") if args.from_date else "start"
+        to_label = args.to_date.strftime("%Y%m%d") if args.to_date else "end"
+        label = f"{from_label}_{to_label}"
+        output_csv = f"sandwiches_{label}.csv"
+        progress_file = f"progress_{label}.txt"
+        print(f"\nDate range resolved in {lookups} header lookups")
+    output_csv = args.output or output_csv
+    
+    if end_block < start_block:
+        print(f"ERROR: No blocks in the requested range")
+        exit(1)
+    
     # Initialize
-    init_csv()
-    current_block = load_progress()
+    init_csv(output_csv)
+    checkpoint = load_checkpoint(progress_file, start_block)
+    coverage = checkpoint["coverage"]
+    retry_queue = RetryQueue(checkpoint["failed"])
     
-    total_blocks = END_BLOCK - START_BLOCK
-    blocks_done = current_block - START_BLOCK
+    total_blocks = end_block - start_block + 1
+    gaps = coverage.gaps(start_block, end_block)
     
-    print(f"\nBlock range: {START_BLOCK:,} to {END_BLOCK:,}")
+    print(f"\nBlock range: {start_block:,} to {end_block:,}")
     print(f"Total blocks: {total_blocks:,}")
-    print(f"Starting from block: {current_block:,}")
-    print(f"Blocks remaining: {END_BLOCK - current_block:,}")
-    print(f"Output file: {OUTPUT_CSV}")
+    print(f"Already scanned: {coverage.count(start_block, end_block):,}")
+    print(f"Blocks remaining: {sum(b - a + 1 for a, b in gaps):,} in {len(gaps)} unscanned ranges")
+    if len(retry_queue):
+        print(f"Failed windows to retry: {len(retry_queue)} ({retry_queue.blocks():,} blocks)")
+    print(f"Concurrency: {SCAN_CONCURRENCY} windows in flight, {CU_PER_SECOND} CU/s Alchemy budget")
+    print(f"Output file: {output_csv}")
     print(f"\nPress Ctrl+C to stop (progress will be saved)\n")
     
-    # NOTE: Free-tier Alchemy only allows eth_getLogs over a 10-block range.
-    # If you upgrade your plan, you can safely increase this to speed up scanning.
-    BATCH_SIZE = 10  # Blocks per batch (must be <= 10 on free tier)
-    total_sandwiches = 0
+    state = {"coverage": coverage, "total_sandwiches": 0, "failed_windows": len(retry_queue)}
     start_time = time.time()
     
     try:
-        while current_block < END_BLOCK:
-            from_block = current_block
-            to_block = min(current_block + BATCH_SIZE - 1, END_BLOCK)
-            
-            # Progress indicator
-            blocks_done = from_block - START_BLOCK
-            progress_pct = (blocks_done / total_blocks) * 100
-            elapsed = time.time() - start_time
-            
-            if blocks_done > 0 and elapsed > 0:
-                blocks_per_sec = blocks_done / elapsed
-                remaining_blocks = END_BLOCK - from_block
-                eta_seconds = remaining_blocks / blocks_per_sec if blocks_per_sec > 0 else 0
-                eta_hours = eta_seconds / 3600
-                eta_str = f"ETA: {eta_hours:.1f}h"
-            else:
-                eta_str = "ETA: calculating..."
-            
-            print(f"\r[{progress_pct:5.2f}%] Block {from_block:,} | {eta_str} | Sandwiches: {total_sandwiches:,}", end="    ", flush=True)
-            
-            # Get all swap events in this batch
-            logs = get_swap_logs(from_block, to_block)
-            
-            if logs:
-                swaps = [parse_swap_event(log) for log in logs]
-                
-                # Group by block
-                by_block = defaultdict(list)
-                for swap in swaps:
-                    by_block[swap["block"]].append(swap)
-                
-                # Get timestamps for blocks with sandwiches
-                block_timestamps = {}
-                
-                batch_sandwiches = []
-                for block_num, block_swaps in by_block.items():
-                    sandwiches = find_sandwiches_in_block(block_swaps)
-                    if sandwiches:
-                        if block_num not in block_timestamps:
-                            block_timestamps[block_num] = get_block_timestamp(block_num)
-                        batch_sandwiches.extend(sandwiches)
-                
-                if batch_sandwiches:
-                    append_to_csv(batch_sandwiches, block_timestamps)
-                    total_sandwiches += len(batch_sandwiches)
-            
-            current_block = to_block + 1
-            save_progress(current_block)
-            
+        asyncio.run(scan(state, start_time, end_block, output_csv, progress_file, start_block=start_block))
     except KeyboardInterrupt:
+        window_sizer.save()
+        density_index.save()
         print(f"\n\n{'=' * 70}")
-        print(f"⏸️  Stopped by user. Progress saved at block {current_block:,}")
-        print(f"Total sandwiches found: {total_sandwiches:,}")
-        print(f"Results saved to: {OUTPUT_CSV}")
+        scanned = state["coverage"].count(start_block, end_block)
+        print(f"⏸️  Stopped by user. Progress saved: {scanned:,} of {total_blocks:,} blocks scanned")
+        if state["failed_windows"]:
+            print(f"Failed windows queued for retry: {state['failed_windows']}")
+        print(f"Total sandwiches found: {state['total_sandwiches']:,}")
+        print(f"Compute units used: {endpoint_pool.cu_spent:,} ({endpoint_pool.cu_per_second():.0f} CU/s)")
+        print(f"Results saved to: {output_csv}")
         print(f"Run again to resume from where you left off.")
         print(f"{'=' * 70}")
         return
     
-    # Completed!
+    window_sizer.save()
+    density_index.save()
     elapsed = time.time() - start_time
     print(f"\n\n{'=' * 70}")
-    print(f"✅ COMPLETED! Scanned all blocks from 2022 to 2024")
-    print(f"Total sandwiches found: {total_sandwiches:,}")
+    gaps = state["coverage"].gaps(start_block, end_block)
+    if gaps:
+        # Not complete while any block is unscanned
+        print(f"⚠️  INCOMPLETE: {sum(b - a + 1 for a, b in gaps):,} blocks in {len(gaps)} ranges unscanned "
+              f"({state['failed_windows']} windows still failing, queued in {progress_file})")
+        print(f"Total sandwiches found: {state['total_sandwiches']:,}")
+        print(f"Compute units used: {endpoint_pool.cu_spent:,} ({endpoint_pool.cu_per_second():.0f} CU/s)")
+        print(f"Results saved to: {output_csv}")
+        print(f"Run again to retry them.")
+        print(f"{'=' * 70}")
+        return
+    
+    # Completed!
+    print(f"✅ COMPLETED! Scanned all blocks from {start_block:,} to {end_block:,}")
+    print(f"Total sandwiches found: {state['total_sandwiches']:,}")
     print(f"Time elapsed: {elapsed/3600:.1f} hours")
-    print(f"Results saved to: {OUTPUT_CSV}")
+    print(f"Compute units used: {endpoint_pool.cu_spent:,} ({endpoint_pool.cu_per_second():.0f} CU/s)")
+    print(f"Results saved to: {output_csv}")
     print(f"{'=' * 70}")
 
 if __name__ == "__main__":
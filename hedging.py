@@ -0,0 +1,67 @@
+"""
+Hedged requests to cut tail latency.
+
+If a call hasn't answered by a latency percentile learned at runtime, the
+same request is sent again (to another endpoint when there is one) and the
+first good answer wins. Hedging at p95 costs roughly 5% extra requests but
+removes most of the slow tail that decides a backfill's ETA.
+
+A request already on the wire can't be recalled with a blocking HTTP
+client: the losing request is cancelled if it hasn't started yet, and
+otherwise left to finish in the background with its answer discarded.
+"""
+
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Recent latencies kept per method, and how many are needed before hedging
+WINDOW = 500
+MIN_SAMPLES = 20
+
+class LatencyTracker:
+    """Sliding window of recent latencies per key, for percentile lookups"""
+
+    def __init__(self, window=WINDOW):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self.lock:
+            self.samples[key].append(seconds)
+
+    def percentile(self, key, pct):
+        """The `pct` percentile latency for `key`, or None until there are enough samples"""
+        with self.lock:
+            samples = sorted(self.samples[key])
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def is_good(future):
+    """A finished call that returned a response without an error"""
+    return future.exception() is None and "error" not in future.result()
+
+def hedged(primary, backup, delay, executor):
+    """
+    Run primary(); if it hasn't finished after `delay` seconds, also run
+    backup(). Returns the first good response, or if neither is good, the
+    outcome of whichever finished first.
+    """
+    first = executor.submit(primary)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    second = executor.submit(backup)
+    pending = {first, second}
+    finished = []
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if is_good(future):
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+            finished.append(future)
+    return finished[0].result()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Multi-machine backfill coordinated through a shared lease table.
+
+The block range is cut into leases of LEASE_BLOCKS blocks, kept in a SQLite
+database (coordinator.sqlite) in a directory every worker can reach. A
+worker leases the first range nobody holds, scans it with the normal scan
+loop into its own CSV segment and checkpoint under workers/<name>/, and
+marks the lease done. While scanning it renews the lease every third of
+LEASE_SECONDS. A worker that dies (or loses the network) stops renewing,
+its lease expires, and the next worker to ask takes the range over. Every
+grant bumps the lease's token, and renewing or completing needs the current
+token, so a worker whose lease was taken over stops scanning it and can't
+mark it done.
+
+`collect` merges the segments once every lease is done. For each lease it
+takes the rows of the worker that completed it, read only from the part of
+that worker's CSV its checkpoint covers, and checks that worker's coverage
+map includes the whole lease. Rows a dead or superseded worker left behind
+are never merged, so the result has every row exactly once; it is written
+sorted by block (see merge_csv.py).
+
+SQLite needs working file locks: use a local disk for workers on one
+machine, or a network filesystem with locking (or copy each workers/<name>/
+directory over before collecting). Lease expiry compares wall clocks, so
+keep the machines' clocks in sync. Each worker uses the providers and CU
+budget from its own .env.
+
+Usage:
+    python3 lease_scan.py work [--worker NAME] [--dir distributed] [--lease-blocks 10000]
+    python3 lease_scan.py status [--dir distributed]
+    python3 lease_scan.py collect [--dir distributed] [--output sandwiches.csv]
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import find_sandwiches as fs
+import merge_csv
+from coverage import Coverage
+from shard_scan import equal_ranges
+
+COORD_DIR = "distributed"
+DB_NAME = "coordinator.sqlite"
+
+# Blocks per lease: small enough that a lost lease costs little rework
+LEASE_BLOCKS = int(os.environ.get("LEASE_BLOCKS", "10000"))
+# A lease not renewed for this long is handed to another worker
+LEASE_SECONDS = float(os.environ.get("LEASE_SECONDS", "120"))
+# How often an idle worker asks again while other workers hold every open lease
+IDLE_SECONDS = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    start INTEGER PRIMARY KEY,
+    end INTEGER NOT NULL,
+    worker TEXT,                        -- current holder, NULL when free
+    token INTEGER NOT NULL DEFAULT 0,   -- bumped on every grant
+    expires REAL NOT NULL DEFAULT 0,
+    done_by TEXT                        -- worker whose rows count for this range
+)
+"""
+
+def connect(directory):
+    """Open the lease database in directory (one connection per thread)"""
+    db = sqlite3.connect(os.path.join(directory, DB_NAME), timeout=60, isolation_level=None)
+    db.execute(SCHEMA)
+    return db
+
+@contextmanager
+def transaction(db):
+    """Write transaction: takes the database lock up front, so lease reads and grants are atomic"""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+def create_leases(db, start_block, end_block, lease_blocks=LEASE_BLOCKS):
+    """Cut the block range into leases, unless a worker already did"""
+    with transaction(db):
+        if db.execute("SELECT COUNT(*) FROM leases").fetchone()[0]:
+            return
+        num_leases = -(-(end_block - start_block + 1) // lease_blocks)
+        db.executemany("INSERT INTO leases (start, end) VALUES (?, ?)",
+                       equal_ranges(start_block, end_block, num_leases))
+
+def acquire(db, worker):
+    """
+    Lease the next range for worker: one it still holds from an earlier run
+    first, then the lowest one that is free or expired. Returns
+    {"start", "end", "token"}, or None if no lease is available.
+    """
+    with transaction(db):
+        now = time.time()
+        row = db.execute(
+            "SELECT start, end, token FROM leases"
+            " WHERE done_by IS NULL AND (worker = ? OR worker IS NULL OR expires < ?)"
+            " ORDER BY worker IS NOT ?, start LIMIT 1", (worker, now, worker)).fetchone()
+        if row is None:
+            return None
+        start, end, token = row
+        db.execute("UPDATE leases SET worker = ?, token = ?, expires = ? WHERE start = ?",
+                   (worker, token + 1, now + LEASE_SECONDS, start))
+    return {"start": start, "end": end, "token": token + 1}
+
+def renew(db, lease, worker):
+    """Extend a lease. False if it has been taken over"""
+    cursor = db.execute(
+        "UPDATE leases SET expires = ? WHERE start = ? AND worker = ? AND token = ? AND done_by IS NULL",
+        (time.time() + LEASE_SECONDS, lease["start"], worker, lease["token"]))
+    return cursor.rowcount == 1
+
+def complete(db, lease, worker):
+    """Mark a lease done by worker. False if it has been taken over"""
+    cursor = db.execute(
+        "UPDATE leases SET done_by = ?, worker = NULL, expires = 0 WHERE start = ? AND worker = ? AND token = ?",
+        (worker, lease["start"], worker, lease["token"]))
+    return cursor.rowcount == 1
+
+def release(db, lease, worker):
+    """Give a lease back unfinished, so any worker can take it at once"""
+    db.execute("UPDATE leases SET worker = NULL, expires = 0 WHERE start = ? AND worker = ? AND token = ?",
+               (lease["start"], worker, lease["token"]))
+
+def keep_lease(directory, lease, worker, done, lost):
+    """Renew a lease until done is set; set lost if it was taken over"""
+    db = connect(directory)
+    try:
+        while not done.wait(LEASE_SECONDS / 3):
+            if not renew(db, lease, worker):
+                lost.set()
+                return
+    finally:
+        db.close()
+
+def worker_files(directory, worker):
+    """(CSV segment, progress file) of a worker"""
+    worker_dir = os.path.join(directory, "workers", worker)
+    return os.path.join(worker_dir, "sandwiches.csv"), os.path.join(worker_dir, "progress.txt")
+
+def work(directory, worker, lease_blocks):
+    """Lease and scan ranges until every lease is done (or Ctrl+C)"""
+    output_csv, progress_file = worker_files(directory, worker)
+    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    fs.init_csv(output_csv)
+    db = connect(directory)
+    create_leases(db, fs.START_BLOCK, fs.END_BLOCK, lease_blocks)
+    total_sandwiches = 0
+    leases_done = 0
+
+    while True:
+        lease = acquire(db, worker)
+        if lease is None:
+            if not db.execute("SELECT COUNT(*) FROM leases WHERE done_by IS NULL").fetchone()[0]:
+                break
+            print(f"Every open lease is held by another worker; asking again in {IDLE_SECONDS:.0f}s")
+            time.sleep(IDLE_SECONDS)
+            continue
+
+        print(f"Leased blocks {lease['start']:,} to {lease['end']:,}")
+        done, lost = threading.Event(), threading.Event()
+        keeper = threading.Thread(target=keep_lease, args=(directory, lease, worker, done, lost), daemon=True)
+        keeper.start()
+        state = {"total_sandwiches": 0}
+        try:
+            asyncio.run(fs.scan(
+                state,
+                time.time(),
+                start_block=lease["start"],
+                end_block=lease["end"],
+                output_csv=output_csv,
+                progress_file=progress_file,
+                show_progress=False,
+                should_stop=lost.is_set,
+            ))
+        except KeyboardInterrupt:
+            done.set()
+            keeper.join()
+            release(db, lease, worker)
+            print(f"\nStopped. Released blocks {lease['start']:,} to {lease['end']:,}; run again to resume.")
+            break
+        finally:
+            done.set()
+            keeper.join()
+            fs.window_sizer.save()
+            fs.density_index.save()
+        total_sandwiches += state["total_sandwiches"]
+
+        if lost.is_set():
+            print(f"Lease on blocks {lease['start']:,} to {lease['end']:,} was taken over; dropping it")
+        elif state["coverage"].is_complete(lease["start"], lease["end"]) and complete(db, lease, worker):
+            leases_done += 1
+            print(f"Done blocks {lease['start']:,} to {lease['end']:,} ({state['total_sandwiches']:,} sandwiches)")
+        else:
+            # Windows still failing: give the range back to be retried
+            release(db, lease, worker)
+            print(f"Blocks {lease['start']:,} to {lease['end']:,} incomplete "
+                  f"({state['failed_windows']} windows still failing); released")
+
+    db.close()
+    print(f"\nWorker {worker}: {leases_done} leases done, {total_sandwiches:,} sandwiches found, "
+          f"{fs.endpoint_pool.cu_spent:,} CU used")
+
+def print_status(directory):
+    """Print lease counts, the leases being scanned, and leases done per worker"""
+    db = connect(directory)
+    now = time.time()
+    leases = db.execute("SELECT start, end, worker, expires, done_by FROM leases ORDER BY start").fetchall()
+    db.close()
+    if not leases:
+        print("No leases yet (start a worker first)")
+        return
+    done = [l for l in leases if l[4] is not None]
+    active = [l for l in leases if l[4] is None and l[2] is not None and l[3] >= now]
+    total_blocks = sum(end - start + 1 for start, end, *_ in leases)
+    blocks_done = sum(end - start + 1 for start, end, *_ in done)
+    print(f"Blocks done: {blocks_done:,} of {total_blocks:,} ({blocks_done / total_blocks * 100:.2f}%)")
+    print(f"Leases: {len(done)} done, {len(active)} being scanned, {len(leases) - len(done) - len(active)} open")
+    for start, end, worker, expires, _ in active:
+        print(f"  {worker}: blocks {start:,} to {end:,} (lease expires in {expires - now:.0f}s)")
+    per_worker = {}
+    for lease in done:
+        per_worker[lease[4]] = per_worker.get(lease[4], 0) + 1
+    for worker, count in sorted(per_worker.items()):
+        print(f"  {worker}: {count} leases done")
+
+def committed_lines(path, size):
+    """Lines in the first `size` bytes of a file: the rows its checkpoint covers"""
+    with open(path, 'rb') as f:
+        for line in f:
+            size -= len(line)
+            if size < 0:
+                break
+            yield line.decode()
+
+def collect(directory, output_csv):
+    """
+    Merge the workers' segments into output_csv (sorted and deduplicated,
+    see merge_csv.py), each lease's rows taken from the worker that
+    completed it. Returns the number of rows written.
+    """
+    db = connect(directory)
+    leases = db.execute("SELECT start, end, done_by FROM leases ORDER BY start").fetchall()
+    db.close()
+    open_leases = sum(1 for *_, done_by in leases if done_by is None)
+    if not leases or open_leases:
+        raise RuntimeError(f"{open_leases} of {len(leases)} leases are not done yet")
+
+    owned = {}
+    for start, end, worker in leases:
+        owned.setdefault(worker, []).append((start, end))
+
+    segments = []
+    for worker, ranges in sorted(owned.items()):
+        segment, progress_file = worker_files(directory, worker)
+        checkpoint = fs.load_checkpoint(progress_file, ranges[0][0])
+        missing = [r for r in ranges if not checkpoint["coverage"].is_complete(*r)]
+        if missing:
+            raise RuntimeError(f"{progress_file} doesn't cover {len(missing)} leases marked done by {worker}, "
+                               f"e.g. blocks {missing[0][0]:,} to {missing[0][1]:,}")
+        segments.append((segment, checkpoint["output_bytes"] or 0, Coverage(ranges)))
+
+    def owned_rows():
+        for segment, size, blocks in segments:
+            reader = csv.reader(committed_lines(segment, size))
+            next(reader, None)  # skip header
+            for row in reader:
+                if int(row[merge_csv.BLOCK_COL]) in blocks:
+                    yield row
+
+    written, _ = merge_csv.sort_rows(owned_rows(), output_csv)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-machine sandwich backfill with a shared lease table")
+    parser.add_argument("command", choices=["work", "status", "collect"])
+    parser.add_argument("--dir", default=COORD_DIR, help=f"shared directory with the lease database (default: {COORD_DIR})")
+    parser.add_argument("--worker", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="worker name; reuse it to resume that worker's segment (default: host-pid)")
+    parser.add_argument("--lease-blocks", type=int, default=LEASE_BLOCKS,
+                        help=f"blocks per lease, used when the leases are created (default: {LEASE_BLOCKS})")
+    parser.add_argument("--output", default=fs.OUTPUT_CSV, help=f"merged CSV for collect (default: {fs.OUTPUT_CSV})")
+    args = parser.parse_args()
+
+    if args.command != "work" and not os.path.exists(os.path.join(args.dir, DB_NAME)):
+        print(f"ERROR: No lease database in {args.dir}/ (start a worker first)")
+        exit(1)
+    if args.command == "status":
+        print_status(args.dir)
+        return
+    if args.command == "collect":
+        try:
+            rows = collect(args.dir, args.output)
+        except RuntimeError as e:
+            print(f"ERROR: {e}")
+            exit(1)
+        print(f"Merged {rows:,} rows into {args.output}")
+        return
+
+    if not len(fs.endpoint_pool):
+        print("ERROR: Please set the ALCHEMY_KEY environment variable (or RPC_ENDPOINTS)")
+        exit(1)
+
+    print("=" * 70)
+    print("🥪 Sandwich Attack Detector - distributed backfill")
+    print("=" * 70)
+    print(f"\nBlock range: {fs.START_BLOCK:,} to {fs.END_BLOCK:,}")
+    print(f"Worker: {args.worker}")
+    print(f"Lease database: {os.path.join(args.dir, DB_NAME)}")
+    print(f"\nPress Ctrl+C to stop (progress will be saved)\n")
+    os.makedirs(args.dir, exist_ok=True)
+    work(args.dir, args.worker, args.lease_blocks)
+    print(f"Run `python3 lease_scan.py status` to see overall progress, then `collect` when every lease is done.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Sort and deduplicate sandwich CSVs in bounded memory.
+
+Scans write windows as they finish, shards and distributed workers each
+write their own segment, and the same rows can turn up in more than one of
+them. This merges any number of CSVs into one file with the scanner's
+columns, ordered by (block_number, frontrun_tx, victim_tx), with exact
+duplicate rows dropped.
+
+It is an external merge sort: rows are read in chunks of SORT_CHUNK_ROWS,
+each chunk is sorted in memory and spilled to a temporary run file next to
+the output, and the runs are k-way merged with heapq.merge (at most
+MERGE_FAN_IN open at a time, in several passes if there are more). Memory
+use is one chunk however large the input; disk use is about twice the
+input. Duplicates end up next to each other in the merge and are dropped
+there. Input that fits in one chunk is sorted without temporary files.
+
+Usage:
+    python3 merge_csv.py OUTPUT INPUT [INPUT ...]
+    python3 merge_csv.py sandwiches.csv sandwiches.csv    # sort one file in place
+"""
+
+import argparse
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+from itertools import chain
+
+from csv_schema import CSV_COLUMNS
+
+# Rows sorted in memory at a time (roughly 1 KB of memory each)
+SORT_CHUNK_ROWS = int(os.environ.get("SORT_CHUNK_ROWS", "200000"))
+# Run files merged at once
+MERGE_FAN_IN = 64
+
+BLOCK_COL = CSV_COLUMNS.index("block_number")
+FRONTRUN_COL = CSV_COLUMNS.index("frontrun_tx")
+VICTIM_COL = CSV_COLUMNS.index("victim_tx")
+
+def sort_key(row):
+    """Order by block, frontrun tx and victim tx; the whole row breaks ties so duplicates sort together"""
+    return int(row[BLOCK_COL]), row[FRONTRUN_COL], row[VICTIM_COL], row
+
+def read_segment(path):
+    """Rows of a sandwich CSV, header checked and skipped"""
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is not None and header != CSV_COLUMNS:
+            raise ValueError(f"{path} doesn't have the sandwich CSV columns")
+        yield from reader
+
+def unique(rows):
+    """Drop rows equal to the one before (duplicates of sorted input)"""
+    previous = None
+    for row in rows:
+        if row != previous:
+            yield row
+        previous = row
+
+def write_rows(path, rows, header=None):
+    """Write rows (and a header) to a CSV. Returns the number of rows"""
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def read_run(path):
+    with open(path, 'r', newline='') as f:
+        yield from csv.reader(f)
+
+def merge_runs(paths):
+    """Sorted, deduplicated rows of several sorted run files"""
+    return unique(heapq.merge(*(read_run(p) for p in paths), key=sort_key))
+
+def sort_rows(rows, output_csv, chunk_rows=SORT_CHUNK_ROWS, fan_in=MERGE_FAN_IN):
+    """
+    Write rows to output_csv (header included) sorted and without exact
+    duplicates, holding at most chunk_rows in memory. The output is
+    replaced only once it is complete, so it may also be one of the inputs.
+    Returns (rows written, rows read).
+    """
+    run_dir = tempfile.mkdtemp(prefix=".sort-", dir=os.path.dirname(os.path.abspath(output_csv)))
+    try:
+        runs = []
+        chunk = []
+        rows_read = 0
+        for row in chain(rows, [None]):
+            if row is not None:
+                chunk.append(row)
+                rows_read += 1
+                if len(chunk) < chunk_rows:
+                    continue
+            elif not runs:
+                break  # Everything fit in one chunk
+            if chunk:
+                chunk.sort(key=sort_key)
+                runs.append(os.path.join(run_dir, f"run{len(runs)}.csv"))
+                write_rows(runs[-1], unique(chunk))
+                chunk = []
+
+        # Merge passes until the runs can be merged in one go
+        generation = 0
+        while len(runs) > fan_in:
+            generation += 1
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                merged.append(os.path.join(run_dir, f"merge{generation}_{len(merged)}.csv"))
+                write_rows(merged[-1], merge_runs(runs[i:i + fan_in]))
+                for path in runs[i:i + fan_in]:
+                    os.remove(path)
+            runs = merged
+
+        if runs:
+            sorted_rows = merge_runs(runs)
+        else:
+            chunk.sort(key=sort_key)
+            sorted_rows = unique(chunk)
+        tmp_path = output_csv + ".tmp"
+        written = write_rows(tmp_path, sorted_rows, header=CSV_COLUMNS)
+        os.replace(tmp_path, output_csv)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return written, rows_read
+
+def merge_files(inputs, output_csv, chunk_rows=SORT_CHUNK_ROWS):
+    """Sort and deduplicate several sandwich CSVs into output_csv. Returns (rows written, rows read)"""
+    return sort_rows(chain.from_iterable(read_segment(p) for p in inputs), output_csv, chunk_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sandwich CSVs into one sorted, deduplicated CSV")
+    parser.add_argument("output", help="merged CSV (may also be an input)")
+    parser.add_argument("inputs", nargs="+", help="CSVs to merge")
+    parser.add_argument("--chunk-rows", type=int, default=SORT_CHUNK_ROWS,
+                        help=f"rows sorted in memory at a time (default: {SORT_CHUNK_ROWS:,})")
+    args = parser.parse_args()
+
+    written, rows_read = merge_files(args.inputs, args.output, args.chunk_rows)
+    print(f"Merged {rows_read:,} rows from {len(args.inputs)} files into {args.output}")
+    print(f"Rows written: {written:,} ({rows_read - written:,} duplicates dropped)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Client-side throttling for RPC calls.
+
+Providers meter usage in compute units (CU) per second, and eth_getLogs
+costs several times more than a header lookup. Throttle combines:
+
+  - a TokenBucket that spends each call's CU cost against the plan's CU/s
+    budget, so we pace ourselves instead of waiting for 429s, and
+  - an AIMDController that caps concurrent requests: +1 slot after a full
+    round of healthy responses, halved on a 429, a failed request or a
+    latency spike.
+
+It also counts the CU of the calls the provider answered so a scan can
+report its cost. Budget is taken before a call goes out, but requests that
+fail in transit or are rate limited aren't counted as spent.
+"""
+
+import threading
+import time
+
+# Alchemy compute-unit cost per method
+METHOD_CU = {
+    "eth_getLogs": 75,
+    "eth_getBlockByNumber": 16,
+    "eth_blockNumber": 10,
+}
+DEFAULT_CU = 26
+
+# A response this many times slower than the running average counts as a spike
+LATENCY_SPIKE_FACTOR = 3.0
+
+# Don't halve concurrency more than once per this many seconds
+DECREASE_COOLDOWN = 1.0
+
+RATE_LIMIT_HINTS = ("rate limit", "compute units", "capacity", "too many requests")
+
+def cu_cost(methods):
+    """Total compute units for a list of RPC methods"""
+    return sum(METHOD_CU.get(m, DEFAULT_CU) for m in methods)
+
+def is_rate_limited(response):
+    """Check whether a JSON-RPC response (or batch of them) was throttled"""
+    if isinstance(response, list):
+        return any(is_rate_limited(r) for r in response)
+    if not isinstance(response, dict) or "error" not in response:
+        return False
+    error = response["error"]
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == 429 or any(hint in message for hint in RATE_LIMIT_HINTS)
+
+class TokenBucket:
+    """Compute-unit budget refilled at `rate` CU per second (0 = unlimited)"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cost):
+        """Block until the budget allows a call costing `cost` CU, then spend it"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Calls bigger than the whole bucket (large batches) may go
+                # into debt; later calls then wait for it to be repaid
+                if self.tokens >= min(cost, self.capacity):
+                    self.tokens -= cost
+                    return
+                wait = (min(cost, self.capacity) - self.tokens) / self.rate
+            time.sleep(wait)
+
+class AIMDController:
+    """Concurrency limit with additive increase and multiplicative decrease"""
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self.latency = {}  # request kind -> average latency (seconds)
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free concurrency slot"""
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, kind, latency, throttled=False):
+        """
+        Free a slot and adjust the limit from how the request went
+        (throttled: rate limited or failed, a signal to back off)
+        """
+        with self.cond:
+            self.in_flight -= 1
+            average = self.latency.get(kind)
+
+            if throttled or (average is not None and latency > average * LATENCY_SPIKE_FACTOR):
+                self._decrease()
+            else:
+                # +1 slot once every `limit` healthy responses
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            if not throttled:
+                self.latency[kind] = latency if average is None else 0.9 * average + 0.1 * latency
+            self.cond.notify_all()
+
+    def _decrease(self):
+        now = time.monotonic()
+        # One overload usually shows up as a burst of errors; only back off once for it
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.limit = max(self.minimum, self.limit / 2)
+        self.last_decrease = now
+
+class Throttle:
+    """CU budget plus adaptive concurrency for one RPC endpoint"""
+
+    def __init__(self, cu_per_second, max_concurrency):
+        self.bucket = TokenBucket(cu_per_second)
+        self.concurrency = AIMDController(max_concurrency, max_concurrency)
+        self.started = time.time()
+        self.spent = 0  # CU of calls the provider answered
+        self.lock = threading.Lock()
+
+    def send(self, methods, request):
+        """
+        Run `request()` (which makes the HTTP call for `methods`) once the CU
+        budget and a concurrency slot allow it, and return its response.
+        """
+        cost = cu_cost(methods)
+        self.bucket.acquire(cost)
+        self.concurrency.acquire()
+        kind = methods[0] if len(methods) == 1 else f"batch:{methods[0]}"
+        started = time.monotonic()
+        throttled = False
+        try:
+            response = request()
+            throttled = is_rate_limited(response)
+            if not throttled:
+                with self.lock:
+                    self.spent += cost
+            return response
+        except Exception:
+            # 429s, dropped connections and garbled responses all count
+            # against the limit; none of them is a healthy response
+            throttled = True
+            raise
+        finally:
+            self.concurrency.release(kind, time.monotonic() - started, throttled)
+
+    @property
+    def cu_spent(self):
+        return self.spent
+
+    def cu_per_second(self):
+        """Average CU/s spent since this throttle was created"""
+        elapsed = time.time() - self.started
+        return self.spent / elapsed if elapsed > 0 else 0
@@ -0,0 +1,75 @@
+"""
+Persistent queue of block windows whose eth_getLogs fetch failed.
+
+When every retry of a window fails, the scan can't just treat it as "no
+swaps": that would move progress past blocks that were never scanned. The
+window goes into a RetryQueue instead, which is saved as part of the scan's
+checkpoint (see checkpoint.py), the scan carries on, and failed windows are
+fetched again later with exponential backoff and jitter. A scan only
+reports itself complete once the queue is empty; entries left over are
+retried by the next run.
+"""
+
+import random
+import threading
+import time
+
+# Delay before retrying a window: BASE_DELAY * 2^attempts seconds, capped,
+# with full jitter so many failed windows don't all retry at once
+BASE_DELAY = 2.0
+MAX_DELAY = 300.0
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    """Seconds to wait before retry number `attempt` (0-based): exponential, full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class RetryQueue:
+    """Failed block windows, with attempt counts and next retry times"""
+
+    def __init__(self, entries=()):
+        """entries: what dump() returned"""
+        self.entries = {}  # (from_block, to_block) -> {"attempts", "next_retry", "error"}
+        self.lock = threading.Lock()
+        for entry in entries:
+            self.entries[(entry["from"], entry["to"])] = {
+                "attempts": entry["attempts"],
+                "next_retry": entry["next_retry"],
+                "error": entry["error"],
+            }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, from_block, to_block, error):
+        """Record a failed fetch of a window (again, if it is already queued)"""
+        with self.lock:
+            entry = self.entries.setdefault((from_block, to_block), {"attempts": 0})
+            entry["next_retry"] = time.time() + backoff_delay(entry["attempts"])
+            entry["attempts"] += 1
+            entry["error"] = str(error)
+
+    def resolve(self, from_block, to_block):
+        """A queued window was fetched and written"""
+        with self.lock:
+            self.entries.pop((from_block, to_block), None)
+
+    def due(self, now=None):
+        """Windows whose retry time has come, in block order"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return sorted(k for k, e in self.entries.items() if e["next_retry"] <= now)
+
+    def next_retry(self):
+        """Earliest retry time, or None if the queue is empty"""
+        with self.lock:
+            return min((e["next_retry"] for e in self.entries.values()), default=None)
+
+    def blocks(self):
+        """Total blocks in queued windows"""
+        with self.lock:
+            return sum(to_block - from_block + 1 for from_block, to_block in self.entries)
+
+    def dump(self):
+        """The queue as a JSON-serializable list"""
+        with self.lock:
+            return [{"from": f, "to": t, **e} for (f, t), e in sorted(self.entries.items())]
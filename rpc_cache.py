@@ -0,0 +1,201 @@
+"""
+On-disk cache for immutable JSON-RPC responses.
+
+Results are stored gzip-compressed under the cache directory, addressed by
+the SHA-256 of the request (method + params), so re-running detection over
+history we already fetched reads local disk instead of spending network
+round trips and CU. The caller decides what is immutable; in practice that
+is eth_getLogs and eth_getBlockByNumber over finalized blocks.
+
+eth_getLogs results are also indexed by block range, so a window can be
+served from one larger cached window or from several adjacent smaller ones
+(window sizes adapt, so a re-run rarely asks for exactly the same ranges).
+
+The cache is capped at max_bytes and evicts least-recently-used entries.
+In read-only mode it serves hits but never writes or evicts, e.g. for a
+shared, pre-built cache. Nothing is read or created on disk until the cache
+is first used.
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+
+LOGS_INDEX = "logs_index.txt"
+
+# Evict down to this fraction of max_bytes once the cap is hit
+EVICT_TO = 0.9
+
+def request_key(method, params):
+    """Content address of a request"""
+    blob = json.dumps([method, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def filter_key(log_filter):
+    """Key for an eth_getLogs filter without its block range"""
+    rest = {k: v for k, v in log_filter.items() if k not in ("fromBlock", "toBlock")}
+    return request_key("eth_getLogs", [rest])[:16]
+
+class RPCCache:
+    """Compressed, size-capped, content-addressed store of RPC results"""
+
+    def __init__(self, root, max_bytes, read_only=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        # filter key -> sorted [(from_block, to_block, request key)]
+        self.log_ranges = defaultdict(list)
+        self.size = 0
+        self.opened = False
+        self.open_lock = threading.Lock()
+
+    def _open(self):
+        """Create the directory, measure it and load the log index, once"""
+        if self.opened:
+            return
+        with self.open_lock:
+            if self.opened:
+                return
+            if not self.read_only:
+                os.makedirs(self.root, exist_ok=True)
+                self.size = sum(os.path.getsize(p) for p in self._entry_paths())
+            self._load_log_index()
+            self.opened = True
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json.gz")
+
+    def _entry_paths(self):
+        for sub in os.scandir(self.root):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".json.gz"):
+                        yield entry.path
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = json.loads(gzip.decompress(f.read()))
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        if not self.read_only:
+            os.utime(path)  # mark as recently used
+        return result
+
+    def get(self, method, params):
+        """Cached result for a request, or None"""
+        self._open()
+        return self._read(request_key(method, params))
+
+    def put(self, method, params, result):
+        """Store a request's result"""
+        if self.read_only:
+            return
+        self._open()
+        key = request_key(method, params)
+        path = self._path(key)
+        data = gzip.compress(json.dumps(result, separators=(",", ":")).encode(), compresslevel=5)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if method == "eth_getLogs":
+            log_filter = params[0]
+            self._index_logs(filter_key(log_filter), int(log_filter["fromBlock"], 16),
+                             int(log_filter["toBlock"], 16), key, persist=True)
+
+        with self.lock:
+            self.size += len(data)
+            over = self.size > self.max_bytes
+        if over:
+            self.evict()
+
+    def get_logs(self, log_filter, from_block, to_block):
+        """
+        eth_getLogs result for from_block..to_block assembled from cached
+        windows that cover it, or None if any part of the range is missing
+        """
+        self._open()
+        with self.lock:
+            ranges = self.log_ranges.get(filter_key(log_filter), [])
+            pieces = []
+            block = from_block
+            while block <= to_block:
+                # Of the cached windows that begin at or before `block`, the
+                # one reaching furthest (a later-starting one may be nested)
+                i = bisect.bisect_right(ranges, (block, float("inf"), ""))
+                if i == 0:
+                    return None
+                window = max(ranges[:i], key=lambda r: r[1])
+                if window[1] < block:
+                    return None
+                # The piece only has to supply block..: earlier blocks came
+                # from the previous piece, which cached windows may overlap
+                pieces.append((window, block))
+                block = window[1] + 1
+
+        logs = []
+        for (start, end, key), lo in pieces:
+            cached = self._read(key)
+            if cached is None:
+                return None
+            if start < lo or end > to_block:
+                cached = [log for log in cached if lo <= int(log["blockNumber"], 16) <= to_block]
+            logs.extend(cached)
+        return logs
+
+    def _index_logs(self, fkey, from_block, to_block, key, persist=False):
+        with self.lock:
+            bisect.insort(self.log_ranges[fkey], (from_block, to_block, key))
+            if persist:
+                with open(os.path.join(self.root, LOGS_INDEX), 'a') as f:
+                    f.write(f"{fkey} {from_block} {to_block} {key}\n")
+
+    def _load_log_index(self):
+        path = os.path.join(self.root, LOGS_INDEX)
+        if not os.path.exists(path):
+            return
+        entries = defaultdict(set)
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 4:
+                    entries[parts[0]].add((int(parts[1]), int(parts[2]), parts[3]))
+        self.log_ranges = defaultdict(list, {k: sorted(v) for k, v in entries.items()})
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache is under EVICT_TO of its cap"""
+        self._open()
+        entries = []
+        for path in self._entry_paths():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        size = sum(e[1] for e in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, nbytes, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= nbytes
+
+        # Log ranges pointing at evicted files are dropped lazily: get_logs
+        # treats a missing file as a miss
+        with self.lock:
+            self.size = size
@@ -0,0 +1,109 @@
+"""
+Shared HTTP transport for JSON-RPC calls.
+
+Every call goes through one pooled, keep-alive connection pool per process,
+so consecutive requests reuse their TCP and TLS connections instead of
+reconnecting each time. Set RPC_HTTP2=1 to multiplex requests over HTTP/2
+(needs `pip install "httpx[http2]"`; falls back to HTTP/1.1 otherwise).
+
+Connection failures and timeouts are raised as the built-in
+ConnectionError / TimeoutError regardless of the HTTP library in use, and
+HTTP 429 responses as RateLimited.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Max pooled connections per host. Keep this >= SCAN_CONCURRENCY.
+POOL_SIZE = int(os.environ.get("RPC_POOL_SIZE", "64"))
+
+# Use HTTP/2 multiplexing when available
+USE_HTTP2 = os.environ.get("RPC_HTTP2", "").lower() in ("1", "true", "yes")
+
+HEADERS = {"Content-Type": "application/json"}
+
+class RateLimited(Exception):
+    """The provider answered HTTP 429 Too Many Requests"""
+
+_lock = threading.Lock()
+_session = None
+_http2_client = None
+
+def get_session():
+    """Return the shared keep-alive requests.Session"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+def get_http2_client():
+    """Return the shared HTTP/2 client, or None if HTTP/2 is off or unavailable"""
+    global _http2_client, USE_HTTP2
+    if not USE_HTTP2:
+        return None
+    with _lock:
+        if _http2_client is None:
+            if httpx is None:
+                print("  RPC_HTTP2 is set but httpx is not installed, using HTTP/1.1")
+                USE_HTTP2 = False
+                return None
+            try:
+                _http2_client = httpx.Client(
+                    http2=True,
+                    headers=HEADERS,
+                    limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+                )
+            except ImportError:
+                print("  RPC_HTTP2 is set but the h2 package is missing, using HTTP/1.1")
+                USE_HTTP2 = False
+                return None
+        return _http2_client
+
+def post_json(url, payload, timeout=30):
+    """POST a JSON payload over the shared connection pool and return the decoded response"""
+    client = get_http2_client()
+
+    if client is not None:
+        try:
+            response = client.post(url, json=payload, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+    else:
+        try:
+            response = get_session().post(url, json=payload, timeout=timeout)
+        except requests.exceptions.ConnectionError as e:
+            # Includes connect timeouts: the node was never reached
+            raise ConnectionError(str(e)) from e
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(str(e)) from e
+
+    if response.status_code == 429:
+        raise RateLimited(response.text[:200])
+    return response.json()
+
+def close():
+    """Close all pooled connections"""
+    global _session, _http2_client
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _http2_client is not None:
+            _http2_client.close()
+            _http2_client = None
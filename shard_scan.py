@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Sharded backfill for the sandwich detector.
+
+Splits START_BLOCK..END_BLOCK into shards and scans them in a pool of
+worker processes, so parsing and detection use every core. Each shard has
+its own progress file and CSV segment under shards/; once every shard is
+complete the segments are merged into sandwiches.csv, sorted by block with
+duplicate rows dropped (merge_csv.py).
+
+By default shards are cut for equal expected work rather than equal block
+counts, using the swap-density index (swap_density.json), so workers finish
+together instead of waiting on one straggler in a busy range. Buckets the
+index hasn't seen yet are sampled with a few small eth_getLogs calls first.
+
+Stop with Ctrl+C and run again to resume: finished shards are skipped and
+the others continue from their own progress files. A shard with windows
+that failed every retry (see retry_queue.py) isn't complete until they have
+been fetched, so the merge waits for them. Progress files are checkpoints
+(see checkpoint.py), so a worker killed mid-window leaves no duplicate rows.
+The shard plan is saved on the first run, so later runs reuse it even if
+--shards changes.
+
+Usage:
+    python3 shard_scan.py --shards 32 --workers 16 [--plan equal]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import find_sandwiches as fs
+import merge_csv
+
+SHARD_DIR = "shards"
+PLAN_FILE = os.path.join(SHARD_DIR, "plan.json")
+
+# Set by the parent on Ctrl+C; workers stop after their current window
+stop_event = None
+
+def init_worker(event, num_workers):
+    """
+    Worker process setup: leave Ctrl+C to the parent, which signals
+    stop_event, and take this worker's share of the CU budget. Runs once per
+    process; the pool reuses processes for later shards.
+    """
+    global stop_event
+    stop_event = event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Every worker talks to the same providers, so split the CU budget
+    fs.endpoint_pool.share_budget(1 / num_workers)
+
+def equal_ranges(start_block, end_block, num_shards):
+    """Split the block range into num_shards contiguous ranges of equal size"""
+    total = end_block - start_block + 1
+    bounds = [start_block + total * i // num_shards for i in range(num_shards + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(num_shards) if bounds[i] < bounds[i + 1]]
+
+def balanced_ranges(start_block, end_block, num_shards):
+    """Split the block range into num_shards ranges of equal expected work"""
+    index = fs.density_index
+    missing = index.missing(start_block, end_block)
+    if missing:
+        print(f"Sampling swap density for {len(missing)} unindexed buckets...")
+        index.sample(start_block, end_block, fs.get_swap_logs, fs.SCAN_CONCURRENCY)
+        index.save()
+    return index.split(start_block, end_block, num_shards)
+
+def plan_shards(ranges):
+    """Shard descriptors (block range plus output and progress paths) for a list of ranges"""
+    return [{
+        "index": i,
+        "start": start,
+        "end": end,
+        "output": os.path.join(SHARD_DIR, f"shard_{i:04d}.csv"),
+        "progress": os.path.join(SHARD_DIR, f"progress_{i:04d}.txt"),
+    } for i, (start, end) in enumerate(ranges)]
+
+def load_plan(num_shards, method):
+    """Load the saved shard plan, or create and save one"""
+    if os.path.exists(PLAN_FILE):
+        with open(PLAN_FILE, 'r') as f:
+            plan = json.load(f)
+        if len(plan) != num_shards:
+            print(f"Resuming existing plan with {len(plan)} shards (ignoring --shards {num_shards})")
+        return plan
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    make_ranges = balanced_ranges if method == "density" else equal_ranges
+    plan = plan_shards(make_ranges(fs.START_BLOCK, fs.END_BLOCK, num_shards))
+    with open(PLAN_FILE, 'w') as f:
+        json.dump(plan, f, indent=1)
+    return plan
+
+def shard_blocks_done(shard):
+    """Blocks of a shard already scanned"""
+    return fs.load_progress(shard["progress"], shard["start"]).count(shard["start"], shard["end"])
+
+def is_complete(shard):
+    """Every block scanned (failed windows are left out of the coverage until retried)"""
+    return fs.load_progress(shard["progress"], shard["start"]).is_complete(shard["start"], shard["end"])
+
+def run_shard(shard):
+    """Scan one shard in a worker process. Returns (index, sandwiches found, CU spent)"""
+    # The pool reuses processes, so the pool's CU total includes earlier shards
+    cu_at_start = fs.endpoint_pool.cu_spent
+    state = {"total_sandwiches": 0}
+    if not stop_event.is_set():
+        asyncio.run(fs.scan(
+            state,
+            time.time(),
+            start_block=shard["start"],
+            end_block=shard["end"],
+            output_csv=shard["output"],
+            progress_file=shard["progress"],
+            show_progress=False,
+            should_stop=stop_event.is_set,
+        ))
+    fs.window_sizer.save()
+    fs.density_index.save()
+    return shard["index"], state["total_sandwiches"], fs.endpoint_pool.cu_spent - cu_at_start
+
+def merge_shards(plan, output_csv):
+    """Merge shard segments into one CSV, sorted by block and deduplicated. Returns rows written"""
+    written, _ = merge_csv.merge_files([s["output"] for s in plan], output_csv)
+    return written
+
+def print_progress(plan, start_time, blocks_at_start):
+    """Print the overall progress across shards"""
+    total_blocks = sum(s["end"] - s["start"] + 1 for s in plan)
+    blocks_done = sum(shard_blocks_done(s) for s in plan)
+    shards_done = sum(1 for s in plan if is_complete(s))
+    progress_pct = blocks_done / total_blocks * 100
+    elapsed = time.time() - start_time
+
+    blocks_per_sec = (blocks_done - blocks_at_start) / elapsed if elapsed > 0 else 0
+    if blocks_per_sec > 0:
+        eta_str = f"ETA: {(total_blocks - blocks_done) / blocks_per_sec / 3600:.1f}h"
+    else:
+        eta_str = "ETA: calculating..."
+
+    print(f"\r[{progress_pct:5.2f}%] Shards done: {shards_done}/{len(plan)} | {eta_str}", end="    ", flush=True)
+    return blocks_done
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded multi-process sandwich backfill")
+    parser.add_argument("--shards", type=int, default=os.cpu_count(), help="number of shards (default: CPU count)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--plan", choices=["density", "equal"], default="density",
+                        help="cut shards by expected work (default) or by block count")
+    args = parser.parse_args()
+
+    if not len(fs.endpoint_pool):
+        print("ERROR: Please set the ALCHEMY_KEY environment variable (or RPC_ENDPOINTS)")
+        exit(1)
+
+    print("=" * 70)
+    print("🥪 Sandwich Attack Detector - sharded backfill")
+    print("=" * 70)
+
+    plan = load_plan(args.shards, args.plan)
+    for shard in plan:
+        fs.init_csv(shard["output"])
+    todo = [s for s in plan if not is_complete(s)]
+    workers = max(1, min(args.workers, len(todo)))
+
+    print(f"\nBlock range: {fs.START_BLOCK:,} to {fs.END_BLOCK:,}")
+    print(f"Shards: {len(plan)} ({len(plan) - len(todo)} already complete)")
+    print(f"Workers: {workers}")
+    print(f"Output file: {fs.OUTPUT_CSV} (written when all shards finish)")
+    print(f"\nPress Ctrl+C to stop (progress will be saved)\n")
+
+    # spawn, not fork: the parent already holds pooled connections and threads
+    ctx = multiprocessing.get_context("spawn")
+    event = ctx.Event()
+    start_time = time.time()
+    blocks_at_start = print_progress(plan, start_time, 0)
+    total_sandwiches = 0
+    cu_spent = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=init_worker, initargs=(event, workers)) as pool:
+        pending = {pool.submit(run_shard, shard) for shard in todo}
+        while pending:
+            try:
+                done, pending = wait(pending, timeout=5)
+            except KeyboardInterrupt:
+                print("\n\nStopping workers after their current window...")
+                event.set()
+                continue
+            for future in done:
+                _, sandwiches, cu = future.result()
+                total_sandwiches += sandwiches
+                cu_spent += cu
+            print_progress(plan, start_time, blocks_at_start)
+
+    elapsed = time.time() - start_time
+    print(f"\n\n{'=' * 70}")
+    if not all(is_complete(s) for s in plan):
+        print(f"⏸️  Stopped. Each shard's progress is saved in {SHARD_DIR}/")
+        print(f"Sandwiches found this run: {total_sandwiches:,}")
+        print(f"Compute units used: {cu_spent:,}")
+        print(f"Run again to resume from where you left off.")
+        print(f"{'=' * 70}")
+        return
+
+    merge_shards(plan, fs.OUTPUT_CSV)
+    print(f"✅ COMPLETED! Scanned all {len(plan)} shards")
+    print(f"Sandwiches found this run: {total_sandwiches:,}")
+    print(f"Time elapsed: {elapsed/3600:.1f} hours")
+    print(f"Compute units used: {cu_spent:,}")
+    print(f"Results merged into: {fs.OUTPUT_CSV}")
+    print(f"{'=' * 70}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Compact column-oriented container for decoded Swap events.
+
+Decoding each Swap log into a dict keeps a dozen keys and four hex strings
+(tx hash, pair, sender, recipient) per swap, and a busy window holds
+hundreds of thousands of them. SwapTable keeps one array per field instead,
+with the strings interned: each distinct tx hash or address is stored once
+and swaps refer to it by integer id. Detection and the CSV writer work on
+row numbers and only turn ids back into strings for the rows they output.
+The recipient isn't used by either, so it isn't kept (or interned).
+
+Of the four Swap amounts only the two detection uses are kept: the input on
+the side the swap sells (amount0In for direction 0, amount1In for direction
+1) and the output on the other side. They are uint256, so they stay Python
+ints.
+"""
+
+from array import array
+from collections import defaultdict
+from itertools import repeat
+
+# Hex digits of one all-zero 32-byte word
+ZERO_WORD = "0" * 64
+
+class Interner:
+    """Maps strings to dense integer ids and back"""
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def id(self, value):
+        """Id of a string, assigning the next one if it is new"""
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def intern_many(self, values):
+        """Ids for a list of strings"""
+        return [self.id(value) for value in values]
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+class SwapTable:
+    """Decoded Swap events, one column per field, addressed by row number"""
+
+    __slots__ = ("block", "tx_index", "log_index", "tx", "pair", "sender", "direction",
+                 "amount_in", "amount_out", "hashes", "addresses")
+
+    def __init__(self, addresses=None):
+        self.block = array("q")
+        self.tx_index = array("q")
+        self.log_index = array("q")
+        self.tx = array("q")         # ids in self.hashes
+        self.pair = array("q")       # ids in self.addresses
+        self.sender = array("q")
+        self.direction = array("b")  # 0: sells token0, 1: sells token1
+        self.amount_in = []
+        self.amount_out = []
+        self.hashes = Interner()
+        # Pass an address_table.AddressTable to keep address ids across runs
+        self.addresses = addresses if addresses is not None else Interner()
+
+    @classmethod
+    def from_logs(cls, logs, addresses=None):
+        table = cls(addresses)
+        table.extend_logs(logs)
+        return table
+
+    def __len__(self):
+        return len(self.block)
+
+    def append_log(self, log):
+        """Decode a Swap event log and add it as a row"""
+        data = log["data"]
+        amount0In = int(data[2:66], 16)
+        amount1In = int(data[66:130], 16)
+        amount0Out = int(data[130:194], 16)
+        amount1Out = int(data[194:258], 16)
+
+        # Determine swap direction
+        direction = 0 if amount0In > 0 else 1
+
+        self.block.append(int(log["blockNumber"], 16))
+        self.tx_index.append(int(log["transactionIndex"], 16))
+        self.log_index.append(int(log["logIndex"], 16))
+        self.tx.append(self.hashes.id(log["transactionHash"]))
+        self.pair.append(self.addresses.id(log["address"].lower()))
+        self.sender.append(self.addresses.id("0x" + log["topics"][1][26:].lower()))
+        self.direction.append(direction)
+        if direction == 0:
+            self.amount_in.append(amount0In)
+            self.amount_out.append(amount1Out)
+        else:
+            self.amount_in.append(amount1In)
+            self.amount_out.append(amount0Out)
+
+    def extend_logs(self, logs):
+        """
+        Decode a whole eth_getLogs response; same rows as append_log on each
+        log, about 1.5x faster. Direction is read from the raw hex (is the
+        amount0In word all zeros?), only the two amounts kept are converted
+        to ints, each distinct address is normalized once and all of them
+        are interned in one call, and every column is appended in one extend.
+        """
+        hash_ids = self.hashes.ids
+        hashes = self.hashes.values
+        txs = []
+        direction = []
+        amount_in = []
+        amount_out = []
+        for log in logs:
+            data = log["data"]
+            # Determine swap direction (amount0In > 0)
+            if data[2:66] != ZERO_WORD:
+                direction.append(0)
+                amount_in.append(int(data[2:66], 16))
+                amount_out.append(int(data[194:258], 16))
+            else:
+                direction.append(1)
+                amount_in.append(int(data[66:130], 16))
+                amount_out.append(int(data[130:194], 16))
+
+            tx = hash_ids.get(log["transactionHash"])
+            if tx is None:
+                tx = hash_ids[log["transactionHash"]] = len(hashes)
+                hashes.append(log["transactionHash"])
+            txs.append(tx)
+
+        # Pair addresses and sender topics, each distinct raw string
+        # normalized once and all interned in one call
+        pairs = [log["address"] for log in logs]
+        senders = [log["topics"][1] for log in logs]
+        normalized = {address: address.lower() for address in dict.fromkeys(pairs)}
+        for topic in dict.fromkeys(senders):
+            normalized[topic] = "0x" + topic[26:].lower()
+        ids = dict(zip(normalized, self.addresses.intern_many(list(normalized.values()))))
+
+        self.block.extend(map(int, [log["blockNumber"] for log in logs], repeat(16)))
+        self.tx_index.extend(map(int, [log["transactionIndex"] for log in logs], repeat(16)))
+        self.log_index.extend(map(int, [log["logIndex"] for log in logs], repeat(16)))
+        self.tx.extend(txs)
+        self.pair.extend(map(ids.__getitem__, pairs))
+        self.sender.extend(map(ids.__getitem__, senders))
+        self.direction.extend(direction)
+        self.amount_in.extend(amount_in)
+        self.amount_out.extend(amount_out)
+
+    def tx_hash(self, row):
+        return self.hashes[self.tx[row]]
+
+    def pair_address(self, row):
+        return self.addresses[self.pair[row]]
+
+    def sender_address(self, row):
+        return self.addresses[self.sender[row]]
+
+    def rows_by_block(self):
+        """{block: [row, ...]} with blocks and rows in table order"""
+        by_block = defaultdict(list)
+        for row, block in enumerate(self.block):
+            by_block[block].append(row)
+        return by_block
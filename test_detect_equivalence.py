@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Check that both detection engines find exactly what the original matcher
+found.
+
+The reference is the original per-block matcher (every frontrun tried
+against every later swap of its pair, on decoded dicts), kept here verbatim.
+Random blocks of Swap logs are run through it and through the engines the
+scan uses: the indexed per-pair matcher (find_sandwiches_in_block on a
+SwapTable) and, when numpy is installed, the vectorized batch engine. The
+logs are built to hit the edge cases: backrun inputs on and just past the
+amount tolerance, zero inputs, amounts beyond float precision, victims
+sharing a transaction with the frontrun or backrun, and several pairs and
+attackers per block. Sandwiches must match field for field and in order.
+
+Runs with pytest or directly:
+    python3 test_detect_equivalence.py [--seeds 300]
+"""
+
+import argparse
+import random
+from collections import defaultdict
+
+import batch_detect
+import find_sandwiches as fs
+from swap_table import SwapTable
+
+def parse_swap_event(log):
+    """Parse a Swap event log into structured data (original decoder)"""
+    data = log["data"][2:]  # Remove '0x' prefix
+
+    amount0In = int(data[0:64], 16)
+    amount1In = int(data[64:128], 16)
+    amount0Out = int(data[128:192], 16)
+    amount1Out = int(data[192:256], 16)
+
+    # Determine swap direction
+    direction = 0 if amount0In > 0 else 1
+
+    return {
+        "tx_hash": log["transactionHash"],
+        "tx_index": int(log["transactionIndex"], 16),
+        "log_index": int(log["logIndex"], 16),
+        "pair": log["address"].lower(),
+        "sender": "0x" + log["topics"][1][26:].lower(),
+        "to": "0x" + log["topics"][2][26:].lower(),
+        "amount0In": amount0In,
+        "amount1In": amount1In,
+        "amount0Out": amount0Out,
+        "amount1Out": amount1Out,
+        "direction": direction,
+        "block": int(log["blockNumber"], 16)
+    }
+
+def reference_sandwiches_in_block(swaps):
+    """Find sandwich attacks in a list of swaps from the same block (original matcher)."""
+    sandwiches = []
+
+    by_pair = defaultdict(list)
+    for swap in swaps:
+        by_pair[swap["pair"]].append(swap)
+
+    for pair, pair_swaps in by_pair.items():
+        if len(pair_swaps) < 3:
+            continue
+
+        pair_swaps.sort(key=lambda x: (x["tx_index"], x["log_index"]))
+
+        for i, frontrun in enumerate(pair_swaps):
+            for k in range(i + 2, len(pair_swaps)):
+                backrun = pair_swaps[k]
+
+                if frontrun["sender"] != backrun["sender"]:
+                    continue
+
+                if frontrun["direction"] == backrun["direction"]:
+                    continue
+
+                if frontrun["direction"] == 0:
+                    frontrun_out = frontrun["amount1Out"]
+                    backrun_in = backrun["amount1In"]
+                    revenue_raw = backrun["amount0Out"] - frontrun["amount0In"]
+                else:
+                    frontrun_out = frontrun["amount0Out"]
+                    backrun_in = backrun["amount0In"]
+                    revenue_raw = backrun["amount1Out"] - frontrun["amount1In"]
+
+                if backrun_in == 0 or abs(frontrun_out - backrun_in) / backrun_in > 0.001:
+                    continue
+
+                victims = []
+                for j in range(i + 1, k):
+                    victim = pair_swaps[j]
+                    if victim["direction"] == frontrun["direction"]:
+                        if victim["tx_hash"] != frontrun["tx_hash"] and victim["tx_hash"] != backrun["tx_hash"]:
+                            victims.append(victim)
+
+                if victims:
+                    sandwiches.append({
+                        "block": frontrun["block"],
+                        "pair": pair,
+                        "attacker": frontrun["sender"],
+                        "frontrun_tx": frontrun["tx_hash"],
+                        "backrun_tx": backrun["tx_hash"],
+                        "victim_txs": [v["tx_hash"] for v in victims],
+                        "num_victims": len(victims),
+                        "revenue_raw": revenue_raw,
+                    })
+
+    return sandwiches
+
+def word(value):
+    return f"{value:064x}"
+
+def address(n):
+    return f"0x{n:040x}"
+
+def random_amount(rng):
+    """Small, ordinary and beyond-float-precision amounts"""
+    return rng.choice([
+        rng.randint(1, 2000),
+        rng.randint(10**15, 10**21),
+        rng.randint(2**190, 2**200),
+    ])
+
+def near(rng, amount):
+    """A backrun input on, inside or just outside the tolerance of `amount`"""
+    return rng.choice([
+        amount,
+        amount + 1,
+        amount * 1000 // 1001,        # |out - in| / in just over 0.001
+        amount * 1000 // 999,
+        -(-amount * 1000 // 1001),    # and just under
+        amount * 10000 // 10005,
+        amount * 10000 // 9995,
+        0,
+    ])
+
+def random_logs(seed, num_blocks=4):
+    """
+    Swap logs for a few blocks, dense with near-sandwiches. Blocks come in
+    order, as eth_getLogs returns them; logs within a block are shuffled.
+    """
+    rng = random.Random(seed)
+    pairs = [address(0xa000 + i) for i in range(3)]
+    senders = [address(0xb000 + i) for i in range(4)]
+    logs = []
+    for b in range(num_blocks):
+        block = 15_000_000 + seed * 10 + b
+        recent_outs = defaultdict(list)  # (pair, direction) -> frontrun outputs seen
+        tx_index = 0
+        log_index = 0
+        block_logs = []
+        for _ in range(rng.randint(3, 30)):
+            # Sometimes several swaps in one transaction
+            if rng.random() > 0.2:
+                tx_index += rng.randint(1, 3)
+            tx_hash = f"0x{seed:08x}{block:016x}{tx_index:08x}".ljust(66, "0")
+            log_index += 1
+            pair = rng.choice(pairs[:rng.randint(1, len(pairs))])
+            direction = rng.randint(0, 1)
+            opposite = recent_outs[(pair, 1 - direction)]
+            amount_in = near(rng, rng.choice(opposite)) if opposite and rng.random() < 0.6 else random_amount(rng)
+            amount_out = random_amount(rng)
+            recent_outs[(pair, direction)].append(amount_out)
+            if direction == 0 and amount_in == 0:
+                amount_in = 1  # direction 0 means amount0In > 0
+            amounts = (amount_in, 0, 0, amount_out) if direction == 0 else (0, amount_in, amount_out, 0)
+            block_logs.append({
+                "blockNumber": hex(block),
+                "transactionHash": tx_hash,
+                "transactionIndex": hex(tx_index),
+                "logIndex": hex(log_index),
+                "address": pair,
+                "topics": [fs.SWAP_TOPIC, "0x" + "0" * 24 + rng.choice(senders)[2:], "0x" + "0" * 24 + rng.choice(senders)[2:]],
+                "data": "0x" + "".join(word(a) for a in amounts),
+            })
+        rng.shuffle(block_logs)
+        logs.extend(block_logs)
+    return logs
+
+def reference(logs):
+    """The original scan: decode, group by block in first-seen order, match"""
+    by_block = defaultdict(list)
+    for log in logs:
+        swap = parse_swap_event(log)
+        by_block[swap["block"]].append(swap)
+    sandwiches = []
+    for block_swaps in by_block.values():
+        sandwiches.extend(reference_sandwiches_in_block(block_swaps))
+    return [(s["block"], s["pair"], s["attacker"], s["frontrun_tx"], s["backrun_tx"],
+             tuple(s["victim_txs"]), s["revenue_raw"]) for s in sandwiches]
+
+def normalize(swaps, sandwiches):
+    """Engine output (SwapTable rows) in the reference's terms"""
+    return [(s["block"], swaps.pair_address(s["frontrun"]), swaps.sender_address(s["frontrun"]),
+             swaps.tx_hash(s["frontrun"]), swaps.tx_hash(s["backrun"]),
+             tuple(swaps.tx_hash(v) for v in s["victims"]), s["revenue_raw"]) for s in sandwiches]
+
+def indexed(logs):
+    """The per-pair indexed matcher, as detect_logs runs it"""
+    swaps = SwapTable.from_logs(fs.prefilter_logs(logs))
+    sandwiches = []
+    for rows in swaps.rows_by_block().values():
+        sandwiches.extend(fs.find_sandwiches_in_block(swaps, rows))
+    return normalize(swaps, sandwiches)
+
+def batched(logs):
+    """The vectorized engine, as detect_logs runs it"""
+    swaps = SwapTable.from_logs(fs.prefilter_logs(logs))
+    return normalize(swaps, batch_detect.find_sandwiches_batch(swaps, fs.AMOUNT_TOLERANCE))
+
+def check(seeds):
+    """Compare every engine with the reference over `seeds` random windows. Returns sandwiches compared"""
+    total = 0
+    for seed in range(seeds):
+        logs = random_logs(seed)
+        expected = reference(logs)
+        assert indexed(logs) == expected, f"indexed matcher differs (seed {seed})"
+        if batch_detect.available():
+            assert batched(logs) == expected, f"batch engine differs (seed {seed})"
+        total += len(expected)
+    return total
+
+def test_engines_match_reference():
+    assert check(300) > 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare detection engines with the original matcher")
+    parser.add_argument("--seeds", type=int, default=300, help="random windows to compare (default: 300)")
+    args = parser.parse_args()
+    engines = "indexed and numpy batch engines" if batch_detect.available() else "indexed engine (numpy not installed)"
+    total = check(args.seeds)
+    print(f"OK: {engines} match the original matcher on {args.seeds} windows, {total:,} sandwiches")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Check that hedged requests only touch the backup endpoint when the hedge
+actually fires: picking an endpoint can claim a recovering endpoint's
+health check, so a hedge that never goes out must leave circuit breakers
+as they were. Uses fake endpoints, no network.
+Runs with pytest or directly: python3 test_hedging.py
+"""
+
+import time
+
+import find_sandwiches as fs
+from endpoint_pool import Endpoint, EndpointPool
+
+PAYLOAD = {"id": 1, "jsonrpc": "2.0", "method": "eth_blockNumber", "params": []}
+
+def setup(latency):
+    """Two endpoints; b's circuit is open with its cooldown over. Requests take `latency` seconds"""
+    a = Endpoint("http://a.invalid", 0, 8)
+    b = Endpoint("http://b.invalid", 0, 8)
+    b.circuit = "open"
+    b.down_until = time.time() - 1
+    fs.endpoint_pool = EndpointPool([a, b])
+
+    def post_json(url, payload, timeout=None):
+        if url == a.url:
+            time.sleep(latency)
+        return {"id": 1, "jsonrpc": "2.0", "result": "0x1"}
+    fs.post_json = post_json
+
+    # A learned hedge delay well above how fast the primary answers
+    fs.latencies = fs.LatencyTracker()
+    for _ in range(50):
+        fs.latencies.record("eth_blockNumber", 0.05)
+    return a, b
+
+def test_unfired_hedge_leaves_breaker_alone():
+    a, b = setup(latency=0)
+    for _ in range(50):
+        fs.hedged_send(a, "eth_blockNumber", PAYLOAD)
+    # b was never picked: still waiting for its health check, not holding one
+    assert b.circuit == "open"
+    assert b.probe_started == 0.0
+    assert b.is_healthy(time.time())
+
+def test_fired_hedge_probes_backup():
+    a, b = setup(latency=0.3)
+    fs.hedged_send(a, "eth_blockNumber", PAYLOAD)
+    # The hedge went to b as its health check, and its answer closed the circuit
+    assert b.circuit == "closed"
+
+if __name__ == "__main__":
+    test_unfired_hedge_leaves_breaker_alone()
+    test_fired_hedge_probes_backup()
+    print("OK")
@@ -3,10 +3,11 @@
 Test script to check if your local Ethereum node has historical data.
 """
 
-import requests
 import json
 from datetime import datetime
 
+from rpc_transport import post_json
+
 LOCAL_NODE = "http://192.168.68.62:8545"
 
 def rpc_call(method, params=None):
@@ -19,17 +20,11 @@ def rpc_call(method, params=None):
     }
     
     try:
-        response = requests.post(
-            LOCAL_NODE,
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=10
-        )
-        result = response.json()
+        result = post_json(LOCAL_NODE, payload, timeout=10)
         if "error" in result:
             return {"error": result["error"]}
         return result
-    except requests.exceptions.ConnectionError:
+    except ConnectionError:
         return {"error": "Connection refused - is the node running?"}
     except Exception as e:
         return {"error": str(e)}
@@ -114,8 +109,8 @@ def main():
     if "error" not in result and result.get("result") is not None:
         print("✅ Your local node appears to be an ARCHIVE NODE!")
         print("   It has historical data from 2022 and can be used for sandwich detection.")
-        print(f"\n   To use it, update find_sandwiches.py:")
-        print(f'   ALCHEMY_URL = "{LOCAL_NODE}"')
+        print(f"\n   To use it, add it to your .env:")
+        print(f'   RPC_ENDPOINTS={LOCAL_NODE}')
     else:
         print("⚠️  Your local node may be a FULL NODE (not archive).")
         print("   Full nodes typically only keep recent state (~128 blocks).")
@@ -4,11 +4,12 @@ Quick test to verify Alchemy RPC can access historical Ethereum data from 2022.
 Block 13916166 is approximately Jan 1, 2022.
 """
 
-import requests
 import json
 import os
 from dotenv import load_dotenv
 
+from rpc_transport import post_json
+
 # Load from .env file if it exists
 load_dotenv()
 
@@ -33,12 +34,7 @@ def rpc_call(method, params=None):
         "method": method,
         "params": params or []
     }
-    response = requests.post(
-        ALCHEMY_URL,
-        headers={"Content-Type": "application/json"},
-        json=payload
-    )
-    return response.json()
+    return post_json(ALCHEMY_URL, payload)
 
 def main():
     # 1. Check current block number (verify connection)
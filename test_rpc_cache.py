@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Check that RPCCache.get_logs assembles eth_getLogs ranges from cached
+windows without losing or repeating logs, including when the cached
+windows overlap (as they do after a resumed run picks different window
+edges). Runs with pytest or directly: python3 test_rpc_cache.py
+"""
+
+import tempfile
+
+from rpc_cache import RPCCache
+
+LOG_FILTER = {"topics": ["0xswap"]}
+
+def window_logs(from_block, to_block):
+    """One fake log per block"""
+    return [{"blockNumber": hex(b), "logIndex": "0x0"} for b in range(from_block, to_block + 1)]
+
+def cache_windows(cache, windows):
+    for from_block, to_block in windows:
+        log_filter = dict(LOG_FILTER, fromBlock=hex(from_block), toBlock=hex(to_block))
+        cache.put("eth_getLogs", [log_filter], window_logs(from_block, to_block))
+
+def blocks(logs):
+    return [int(log["blockNumber"], 16) for log in logs]
+
+def test_overlapping_windows():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RPCCache(root, max_bytes=10**9)
+        cache_windows(cache, [(100, 149), (120, 220)])
+        assert blocks(cache.get_logs(LOG_FILTER, 100, 220)) == list(range(100, 221))
+        assert blocks(cache.get_logs(LOG_FILTER, 110, 130)) == list(range(110, 131))
+        assert blocks(cache.get_logs(LOG_FILTER, 140, 200)) == list(range(140, 201))
+
+def test_adjacent_and_nested_windows():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RPCCache(root, max_bytes=10**9)
+        cache_windows(cache, [(100, 109), (110, 119), (105, 112), (120, 140), (118, 125)])
+        assert blocks(cache.get_logs(LOG_FILTER, 100, 140)) == list(range(100, 141))
+        assert blocks(cache.get_logs(LOG_FILTER, 106, 122)) == list(range(106, 123))
+
+def test_window_nested_in_an_earlier_one():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RPCCache(root, max_bytes=10**9)
+        cache_windows(cache, [(100, 199), (150, 159)])
+        assert blocks(cache.get_logs(LOG_FILTER, 170, 180)) == list(range(170, 181))
+        assert blocks(cache.get_logs(LOG_FILTER, 155, 199)) == list(range(155, 200))
+
+def test_gap_is_a_miss():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RPCCache(root, max_bytes=10**9)
+        cache_windows(cache, [(100, 149), (151, 200)])
+        assert cache.get_logs(LOG_FILTER, 100, 200) is None
+        assert cache.get_logs(LOG_FILTER, 90, 120) is None
+
+if __name__ == "__main__":
+    test_overlapping_windows()
+    test_adjacent_and_nested_windows()
+    test_window_nested_in_an_earlier_one()
+    test_gap_is_a_miss()
+    print("OK")
@@ -0,0 +1,133 @@
+"""
+Persistent block-number -> timestamp index.
+
+A flat file of little-endian uint32 timestamps, one per block starting at
+a base block (START_BLOCK), after a 16-byte header. A zero entry means
+"unknown". The whole 2022-2024 range is about 30 MB, so it is read into
+memory once and each new entry is written in place with a positional
+write; shard workers can share one file since they fill different blocks.
+Blocks before the base (a --from-date before 2022) are kept in memory only,
+so they are fetched once per run rather than once per lookup. The file is
+created on first use, not when the index is constructed.
+
+find_block_at_time() maps a UTC time to a block number, for scanning by
+date range.
+"""
+
+import os
+import struct
+import sys
+import threading
+from array import array
+
+MAGIC = b"BTSIDX01"
+HEADER = struct.Struct("<8sQ")  # magic, base block
+
+class TimestampIndex:
+    """uint32 timestamps, backed by a flat file for blocks >= base_block"""
+
+    def __init__(self, path, base_block):
+        self.path = path
+        self.base_block = base_block
+        self.timestamps = array("I")
+        self.before_base = {}  # block -> timestamp, for blocks < base_block
+        self.lock = threading.Lock()
+        self.fd = None
+
+    def _open(self):
+        """Load (or create) the file, once"""
+        with self.lock:
+            if self.fd is not None:
+                return
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    magic, base = HEADER.unpack(f.read(HEADER.size))
+                    if magic != MAGIC:
+                        raise ValueError(f"{self.path} is not a block timestamp index")
+                    self.base_block = base
+                    self.timestamps.frombytes(f.read())
+                if sys.byteorder == "big":
+                    self.timestamps.byteswap()
+            else:
+                with open(self.path, 'wb') as f:
+                    f.write(HEADER.pack(MAGIC, self.base_block))
+            self.fd = os.open(self.path, os.O_RDWR)
+
+    def get(self, block):
+        """Timestamp of a block, or 0 if it isn't in the index"""
+        if self.fd is None:
+            self._open()
+        offset = block - self.base_block
+        if offset < 0:
+            return self.before_base.get(block, 0)
+        if offset < len(self.timestamps):
+            return self.timestamps[offset]
+        return 0
+
+    def set(self, block, timestamp):
+        """Record a block's timestamp (only in memory for blocks before base_block)"""
+        if not timestamp:
+            return
+        if self.fd is None:
+            self._open()
+        offset = block - self.base_block
+        with self.lock:
+            if offset < 0:
+                self.before_base[block] = timestamp
+                return
+            if offset >= len(self.timestamps):
+                self.timestamps.extend([0] * (offset + 1 - len(self.timestamps)))
+            if self.timestamps[offset] == timestamp:
+                return
+            self.timestamps[offset] = timestamp
+            os.pwrite(self.fd, struct.pack("<I", timestamp), HEADER.size + 4 * offset)
+
+    def missing(self, blocks):
+        """The blocks in `blocks` with no timestamp yet"""
+        return [b for b in blocks if not self.get(b)]
+
+# Secant guesses allowed to miss halving the interval before we bisect
+MAX_STALLS = 4
+
+def find_block_at_time(target, get_timestamp, lo, hi):
+    """
+    First block in lo..hi whose timestamp is >= target (hi + 1 if none).
+
+    Block times are nearly regular (12s slots since the Merge), so each
+    guess extrapolates from the local block rate between the two most
+    recent lookups (a secant step), aimed just past the target so the next
+    lookup brackets it. That usually converges in a handful of lookups; if
+    guesses keep failing to halve the interval, the search bisects, so the
+    worst case stays logarithmic.
+    Returns (block, number of timestamps looked up).
+    """
+    ts_lo = get_timestamp(lo)
+    ts_hi = get_timestamp(hi)
+    lookups = 2
+    if ts_lo >= target:
+        return lo, lookups
+    if ts_hi < target:
+        return hi + 1, lookups
+
+    # Invariant: ts(lo) < target <= ts(hi)
+    prev, ts_prev, cur, ts_cur = lo, ts_lo, hi, ts_hi
+    stalls = 0
+    while hi - lo > 1:
+        if stalls >= MAX_STALLS or ts_cur == ts_prev:
+            guess = (lo + hi) // 2
+        else:
+            rate = (cur - prev) / (ts_cur - ts_prev)
+            guess = int(cur + (target - ts_cur) * rate) + (1 if target > ts_cur else 0)
+        guess = min(max(guess, lo + 1), hi - 1)
+
+        ts = get_timestamp(guess)
+        lookups += 1
+        width = hi - lo
+        if ts < target:
+            lo, ts_lo = guess, ts
+        else:
+            hi, ts_hi = guess, ts
+        prev, ts_prev, cur, ts_cur = cur, ts_cur, guess, ts
+        stalls = stalls + 1 if hi - lo > width // 2 else 0
+
+    return hi, lookups
@@ -0,0 +1,102 @@
+"""
+Adaptive eth_getLogs window sizing.
+
+Swap density varies a lot across 2022-2024, so no single block range is
+right everywhere. WindowSizer keeps a window size per region of the chain:
+it grows the size while responses come back small and fast, and halves it
+whenever the provider rejects a range as too large (or times out) and the
+range has to be bisected. The smallest size the provider explicitly rejected
+is remembered as a ceiling for that region so it isn't probed again; a
+timeout may be transient, so it only halves the size.
+"""
+
+import json
+import os
+import threading
+
+# Blocks per region that shares one learned window size
+REGION_BLOCKS = 50_000
+
+# Grow while a window returns fewer than half this many logs...
+TARGET_LOGS = 5_000
+# ...and comes back in under half this many seconds
+TARGET_SECONDS = 5.0
+
+class WindowSizer:
+    """Remembers a good eth_getLogs block range for each region of the chain"""
+
+    def __init__(self, initial, maximum, path=None):
+        self.initial = initial
+        self.maximum = max(initial, maximum)
+        self.path = path
+        self.sizes = {}      # region -> current window size
+        self.ceilings = {}   # region -> smallest size the provider rejected
+        self.last_size = initial
+        self.lock = threading.Lock()
+        self.load()
+
+    def size_for(self, block):
+        """Window size to use for a window starting at `block`"""
+        region = block // REGION_BLOCKS
+        with self.lock:
+            # A new region starts from wherever the previous one ended up
+            size = self.sizes.setdefault(region, self.last_size)
+            self.last_size = size
+            return size
+
+    def record_success(self, block, size, num_logs, seconds):
+        """Adjust the region's size after a window returned normally"""
+        region = block // REGION_BLOCKS
+        with self.lock:
+            current = self.sizes.get(region, self.last_size)
+            ceiling = self.ceilings.get(region, self.maximum + 1)
+
+            if num_logs > TARGET_LOGS or seconds > TARGET_SECONDS:
+                current = max(1, min(current, size) // 2)
+            elif num_logs < TARGET_LOGS / 2 and seconds < TARGET_SECONDS / 2 and size >= current:
+                current = max(1, min(current * 2, self.maximum, ceiling - 1))
+
+            self.sizes[region] = current
+            self.last_size = current
+
+    def record_too_large(self, block, size, rejected=True):
+        """
+        Halve the region's size after a range of `size` blocks failed, and
+        remember it as a ceiling if the provider rejected it (rejected=False
+        for a timeout)
+        """
+        region = block // REGION_BLOCKS
+        with self.lock:
+            if rejected:
+                self.ceilings[region] = min(self.ceilings.get(region, size), size)
+            current = max(1, min(self.sizes.get(region, size), size // 2))
+            self.sizes[region] = current
+            self.last_size = current
+
+    def load(self):
+        """Load learned sizes from a previous run"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            saved = json.load(f)
+        self.sizes = {int(k): min(v, self.maximum) for k, v in saved.get("sizes", {}).items()}
+        self.ceilings = {int(k): v for k, v in saved.get("ceilings", {}).items()}
+
+    def save(self):
+        """
+        Persist learned sizes so the next run starts from them. Merges with
+        what is already on disk, since shard workers each learn their own regions.
+        """
+        if not self.path:
+            return
+        saved = {"sizes": {}, "ceilings": {}}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        with self.lock:
+            saved["sizes"].update({str(k): v for k, v in self.sizes.items()})
+            saved["ceilings"].update({str(k): v for k, v in self.ceilings.items()})
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.path)